@@ -0,0 +1,5 @@
+"""
+richtextpy.benchmarks
+
+Copyright (c) 2016 Sachin Rekhi
+"""
@@ -0,0 +1,274 @@
+"""
+richtextpy.benchmarks.run
+
+Copyright (c) 2016 Sachin Rekhi
+
+Runs the benchmark suite and stores the results as JSON, so runs from different commits can be compared:
+
+	python -m benchmarks.run --output before.json
+	python -m benchmarks.run --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import workloads
+from richtextpy import Delta
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+
+BENCHMARKS = []
+
+def benchmark(name):
+	# register a benchmark, whose setup takes a seeded random.Random and returns (function to time, calls per run)
+	def register(setup):
+		BENCHMARKS.append((name, setup))
+		return setup
+	return register
+
+@benchmark('push/plain')
+def push_plain(rng):
+	words = [rng.choice(workloads.WORDS) + ' ' for i in xrange(20000)]
+	def run():
+		delta = Delta()
+		for word in words:
+			delta.insert(word)
+	return run, len(words)
+
+@benchmark('push/formatted')
+def push_formatted(rng):
+	ops = workloads.formatted_document(rng, 20000).get_ops()
+	def run():
+		delta = Delta()
+		for op in ops:
+			delta.push(op)
+	return run, len(ops)
+
+@benchmark('compose/plain')
+def compose_plain(rng):
+	document = workloads.plain_document(rng, 50000)
+	edits = [workloads.random_edit(rng, document.length()) for i in xrange(5)]
+	def run():
+		for edit in edits:
+			document.compose(edit)
+	return run, len(edits)
+
+@benchmark('compose/formatted')
+def compose_formatted(rng):
+	document = workloads.formatted_document(rng, 50000)
+	edits = [workloads.random_edit(rng, document.length()) for i in xrange(5)]
+	def run():
+		for edit in edits:
+			document.compose(edit)
+	return run, len(edits)
+
+@benchmark('compose/embeds')
+def compose_embeds(rng):
+	document = workloads.embed_document(rng, 50000)
+	edits = [workloads.random_edit(rng, document.length()) for i in xrange(5)]
+	def run():
+		for edit in edits:
+			document.compose(edit)
+	return run, len(edits)
+
+@benchmark('compose/history')
+def compose_history(rng):
+	document = workloads.formatted_document(rng, 100)
+	history = workloads.edit_history(rng, document, 1000)
+	def run():
+		composed = history[0]
+		for edit in history[1:]:
+			composed = composed.compose(edit)
+	return run, len(history)
+
+@benchmark('transform/edits')
+def transform_edits(rng):
+	document = workloads.formatted_document(rng, 1000)
+	pairs = [(workloads.random_edit(rng, document.length()), workloads.random_edit(rng, document.length())) for i in xrange(2000)]
+	def run():
+		for a, b in pairs:
+			a.transform(b, True)
+	return run, len(pairs)
+
+def _cursor_workload(rng):
+	# a change made up of many edits, and the carets and selections of the collaborators it has to move
+	document = workloads.plain_document(rng, 10000)
+	edit = workloads.edit_history(rng, document, 50)
+	change = edit[0]
+	for delta in edit[1:]:
+		change = change.compose(delta)
+	return change, workloads.cursors(rng, document.length(), 500)
+
+@benchmark('transform_position/cursors')
+def transform_position_cursors(rng):
+	change, cursors = _cursor_workload(rng)
+	def run():
+		for cursor in cursors:
+			if isinstance(cursor, tuple):
+				change.transform_position(cursor[0])
+				change.transform_position(cursor[1])
+			else:
+				change.transform_position(cursor)
+	return run, len(cursors)
+
+@benchmark('transform_positions/cursors')
+def transform_positions_cursors(rng):
+	change, cursors = _cursor_workload(rng)
+	def run():
+		change.transform_positions(cursors)
+	return run, len(cursors)
+
+@benchmark('diff/word')
+def diff_word(rng):
+	document = workloads.formatted_document(rng, 20000)
+	changed = document.compose(Delta().retain(document.length() // 2).insert('changed').delete(3))
+	def run():
+		document.diff(changed)
+	return run, 1
+
+@benchmark('diff/formatting')
+def diff_formatting(rng):
+	document = workloads.formatted_document(rng, 20000)
+	changed = document.compose(Delta().retain(document.length() // 2).retain(100, {'underline': True}))
+	def run():
+		document.diff(changed)
+	return run, 1
+
+@benchmark('slice/window')
+def slice_window(rng):
+	document = workloads.formatted_document(rng, 100000)
+	windows = [rng.randint(0, document.length() - 100) for i in xrange(100)]
+	def run():
+		for start in windows:
+			document.slice(start, start + 100)
+	return run, len(windows)
+
+@benchmark('concat/documents')
+def concat_documents(rng):
+	documents = [workloads.formatted_document(rng, 100) for i in xrange(100)]
+	def run():
+		result = Delta()
+		for document in documents:
+			result = result.concat(document)
+	return run, len(documents)
+
+def measure(name, setup, seed, repeat):
+	func, calls = setup(random.Random(seed))
+
+	timings = []
+	for i in xrange(repeat):
+		start = time.time()
+		func()
+		timings.append(time.time() - start)
+
+	peak_memory = None
+	memory_source = None
+	if tracemalloc != None:
+		tracemalloc.start()
+		func()
+		peak_memory = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		memory_source = 'tracemalloc'
+	elif resource != None:
+		peak_memory = _measure_max_rss(name, seed)
+		memory_source = 'max_rss'
+
+	best = min(timings)
+	return {
+		'calls': calls,
+		'best_seconds': best,
+		'ops_per_second': calls / best if best > 0 else None,
+		'peak_memory_bytes': peak_memory,
+		'peak_memory_source': memory_source,
+	}
+
+def _measure_max_rss(name, seed):
+	# without tracemalloc, which Python 2 doesn't have, set up and run the benchmark once in a fresh process and take
+	# its peak resident size above what it was before setup, which is coarser, as it counts the data setup builds as
+	# well as interpreter overhead, but is comparable between runs; None if the peak can't be read
+	try:
+		output = subprocess.check_output([sys.executable, '-m', 'benchmarks.run', '--max-rss', name, '--seed', str(seed)])
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	peak_memory = int(output)
+	return peak_memory if peak_memory > 0 else None
+
+def _max_rss_bytes():
+	# ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+	max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+def _run_max_rss(name, seed):
+	# the peak only ever grows, so it's read before setup, as the run alone may never exceed what setup reached
+	before = _max_rss_bytes()
+	setup = dict(BENCHMARKS)[name]
+	func, calls = setup(random.Random(seed))
+	func()
+	return _max_rss_bytes() - before
+
+def run(names=None, seed=0, repeat=3, out=sys.stdout):
+	results = {}
+	for name, setup in BENCHMARKS:
+		if names and not any([name.startswith(prefix) for prefix in names]):
+			continue
+		results[name] = measure(name, setup, seed, repeat)
+		out.write('%-30s %12.1f ops/s%s\n' % (name, results[name]['ops_per_second'] or 0, _format_memory(results[name]['peak_memory_bytes'])))
+	return {
+		'seed': seed,
+		'repeat': repeat,
+		'python': platform.python_version(),
+		'results': results,
+	}
+
+def compare(previous, current, out=sys.stdout):
+	for name in sorted(current['results']):
+		if name not in previous['results']:
+			continue
+		before = previous['results'][name]['ops_per_second']
+		after = current['results'][name]['ops_per_second']
+		if before and after:
+			out.write('%-30s %+7.1f%%\n' % (name, (after / before - 1) * 100))
+
+def _format_memory(peak_memory):
+	if peak_memory == None:
+		return ''
+	return '  %10.1f KiB peak' % (peak_memory / 1024.0)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark richtextpy operations')
+	parser.add_argument('names', nargs='*', help='only run benchmarks whose names start with these prefixes')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--output', help='write the results as JSON to this file')
+	parser.add_argument('--compare', help='compare against results previously written with --output')
+	parser.add_argument('--max-rss', help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.max_rss:
+		# run by _measure_max_rss() in a fresh process
+		sys.stdout.write('%d\n' % _run_max_rss(args.max_rss, args.seed))
+		return
+
+	results = run(args.names, args.seed, args.repeat)
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=2, sort_keys=True)
+	if args.compare:
+		with open(args.compare) as f:
+			compare(json.load(f), results)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,65 @@
+"""
+richtextpy.benchmarks.workloads
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+from richtextpy import Delta
+
+WORDS = ['the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'lorem', 'ipsum', 'dolor', 'sit', 'amet']
+FORMATS = [{'bold': True}, {'italic': True}, {'link': 'http://quilljs.com'}, {'color': 'red'}, {'bold': True, 'italic': True}]
+EMBEDS = [{'image': 'http://quilljs.com/image%d.png' % i} for i in xrange(5)]
+
+# every workload takes a random.Random seeded by the runner, so results are reproducible
+
+def plain_document(rng, words):
+	delta = Delta()
+	for i in xrange(words):
+		delta.insert(rng.choice(WORDS) + ('\n' if rng.random() < 0.05 else ' '))
+	return delta
+
+def formatted_document(rng, words):
+	delta = Delta()
+	for i in xrange(words):
+		delta.insert(rng.choice(WORDS) + ' ', rng.choice(FORMATS) if rng.random() < 0.5 else None)
+	return delta
+
+def embed_document(rng, words):
+	delta = Delta()
+	for i in xrange(words):
+		if rng.random() < 0.3:
+			delta.insert(rng.choice(EMBEDS), rng.choice([None, {'alt': 'embed'}]))
+		else:
+			delta.insert(rng.choice(WORDS) + ' ')
+	return delta
+
+def random_edit(rng, length):
+	# a typical small edit somewhere in a document of the given length
+	position = rng.randint(0, max(length - 10, 0))
+	choice = rng.random()
+	if choice < 0.5:
+		return Delta().retain(position).insert(rng.choice(WORDS), rng.choice([None, rng.choice(FORMATS)]))
+	elif choice < 0.8:
+		return Delta().retain(position).delete(rng.randint(1, 5))
+	else:
+		return Delta().retain(position).retain(rng.randint(1, 10), rng.choice(FORMATS))
+
+def edit_history(rng, document, edits):
+	# a sequence of edits, each made against the document produced by the previous ones
+	history = []
+	for i in xrange(edits):
+		edit = random_edit(rng, document.length())
+		document = document.compose(edit)
+		history.append(edit)
+	return history
+
+def cursors(rng, length, count):
+	# a mix of carets and selections, like a document with many collaborators
+	result = []
+	for i in xrange(count):
+		start = rng.randint(0, length)
+		if rng.random() < 0.5:
+			result.append(start)
+		else:
+			result.append((start, min(length, start + rng.randint(0, 50))))
+	return result
@@ -4,4 +4,6 @@ richtextpy
 Copyright (c) 2016 Sachin Rekhi
 """
 
-from delta import Delta
\ No newline at end of file
+from delta import Delta
+from document import Document
+from immutable import ImmutableDelta
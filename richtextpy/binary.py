@@ -0,0 +1,201 @@
+"""
+richtextpy.binary
+
+Copyright (c) 2016 Sachin Rekhi
+
+Compact binary encoding of deltas. A buffer starts with a header and holds any number of deltas:
+
+	header     'RTD' followed by the format version byte
+	delta      varint op count, followed by that many ops
+	op         tag byte, [attributes], value
+
+The low two bits of the tag give the op type (text insert, embed insert, retain or delete) and bit 2 is set when
+the op has attributes. Attributes are a varint id into a table shared by every delta in the buffer; an id one past
+the end of the table defines a new entry, followed by its varint length and JSON encoding. Text inserts are a varint
+length and UTF-8 bytes, embeds a varint length and their JSON encoding, and retains and deletes a varint length.
+"""
+
+import json
+from op import intern_attributes
+from type_utils import FrozenDict
+
+MAGIC = 'RTD'
+VERSION = 1
+
+TEXT = 0
+EMBED = 1
+RETAIN = 2
+DELETE = 3
+HAS_ATTRIBUTES = 4
+
+
+class Encoder(object):
+	# encodes deltas one after another into a single buffer, sharing one attribute table between them
+	def __init__(self):
+		self._buffer = bytearray(MAGIC)
+		self._buffer.append(VERSION)
+		self._attribute_ids = dict()
+		self._frozen_attribute_ids = dict()
+
+	def write(self, ops):
+		buffer = self._buffer
+		_write_varint(buffer, len(ops))
+
+		for op in ops:
+			attributes = op.get('attributes')
+			tag = HAS_ATTRIBUTES if attributes else 0
+
+			if 'insert' in op:
+				value = op['insert']
+				if isinstance(value, unicode):
+					tag |= TEXT
+					value = value.encode('utf-8')
+				elif isinstance(value, str):
+					tag |= TEXT
+				else:
+					tag |= EMBED
+					value = _dumps(value)
+			elif 'delete' in op:
+				tag |= DELETE
+				value = _length(op['delete'])
+			else:
+				tag |= RETAIN
+				value = _length(op['retain'])
+
+			buffer.append(tag)
+			if attributes:
+				self._write_attributes(attributes)
+
+			if isinstance(value, str):
+				_write_varint(buffer, len(value))
+				buffer.extend(value)
+			else:
+				_write_varint(buffer, value)
+
+		return self
+
+	def getvalue(self):
+		return str(self._buffer)
+
+	def _write_attributes(self, attributes):
+		# the table is keyed on the JSON encoding, as equal attributes can still encode differently, like 1 and True
+		# frozen attributes, such as interned ones, can't change, so they're also looked up by identity without encoding
+		# them again, holding on to each one so its id stays unique
+		frozen = isinstance(attributes, FrozenDict)
+		if frozen and (id(attributes) in self._frozen_attribute_ids):
+			_write_varint(self._buffer, self._frozen_attribute_ids[id(attributes)][1])
+			return
+
+		encoded = _dumps(attributes)
+		attribute_id = self._attribute_ids.get(encoded)
+		if attribute_id == None:
+			attribute_id = len(self._attribute_ids)
+			self._attribute_ids[encoded] = attribute_id
+			_write_varint(self._buffer, attribute_id)
+			_write_varint(self._buffer, len(encoded))
+			self._buffer.extend(encoded)
+		else:
+			_write_varint(self._buffer, attribute_id)
+
+		if frozen:
+			self._frozen_attribute_ids[id(attributes)] = (attributes, attribute_id)
+
+def encode(ops):
+	return Encoder().write(ops).getvalue()
+
+def encode_many(ops_list):
+	encoder = Encoder()
+	for ops in ops_list:
+		encoder.write(ops)
+	return encoder.getvalue()
+
+def decode(data):
+	# decode a buffer holding a single delta
+	ops_list = list(decode_many(data))
+	if len(ops_list) != 1:
+		raise ValueError('Expected a single delta but found %d' % len(ops_list))
+	return ops_list[0]
+
+def decode_many(data):
+	# generator yielding the ops of each delta in the buffer in turn
+	# malformed buffers, including ones cut short, raise ValueError
+	data = bytearray(data)
+	if (len(data) <= len(MAGIC)) or (data[:len(MAGIC)] != bytearray(MAGIC)):
+		raise ValueError('Not a binary encoded delta')
+	if data[len(MAGIC)] != VERSION:
+		raise ValueError('Unsupported binary delta version %d' % data[len(MAGIC)])
+
+	attributes_table = []
+	position = len(MAGIC) + 1
+	while position < len(data):
+		count, position = _read_varint(data, position)
+		ops = []
+		for i in xrange(count):
+			tag, position = _read_bytes(data, position, 1)
+			tag = tag[0]
+			if tag & ~(HAS_ATTRIBUTES | 3):
+				raise ValueError('Invalid op tag %d at byte %d' % (tag, position - 1))
+
+			attributes = None
+			if tag & HAS_ATTRIBUTES:
+				attribute_id, position = _read_varint(data, position)
+				if attribute_id == len(attributes_table):
+					length, position = _read_varint(data, position)
+					encoded, position = _read_bytes(data, position, length)
+					attributes_table.append(intern_attributes(json.loads(str(encoded))))
+				elif attribute_id > len(attributes_table):
+					raise ValueError('Unknown attribute id %d at byte %d' % (attribute_id, position))
+				attributes = attributes_table[attribute_id]
+
+			kind = tag & 3
+			value, position = _read_varint(data, position)
+			if kind == TEXT:
+				encoded, position = _read_bytes(data, position, value)
+				op = {'insert': encoded.decode('utf-8')}
+			elif kind == EMBED:
+				encoded, position = _read_bytes(data, position, value)
+				op = {'insert': json.loads(str(encoded))}
+			elif kind == RETAIN:
+				op = {'retain': value}
+			else:
+				op = {'delete': value}
+
+			if attributes:
+				op['attributes'] = attributes
+			ops.append(op)
+		yield ops
+
+def _dumps(value):
+	return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+def _length(value):
+	# retain and delete lengths are written as varints, so only integers can be encoded
+	if isinstance(value, bool) or not isinstance(value, (int, long)) or (value < 0):
+		raise ValueError('Op length %r is not a non-negative integer' % (value,))
+	return value
+
+def _write_varint(buffer, value):
+	# unsigned LEB128, seven bits at a time starting with the lowest
+	while value >= 0x80:
+		buffer.append((value & 0x7f) | 0x80)
+		value >>= 7
+	buffer.append(value)
+
+def _read_bytes(data, position, length):
+	# returns (bytes, position), the next length bytes and the position after them
+	if position + length > len(data):
+		raise ValueError('Binary delta ends unexpectedly at byte %d' % len(data))
+	return data[position:position + length], position + length
+
+def _read_varint(data, position):
+	value = 0
+	shift = 0
+	while True:
+		if position >= len(data):
+			raise ValueError('Binary delta ends unexpectedly at byte %d' % len(data))
+		byte = data[position]
+		position += 1
+		value |= (byte & 0x7f) << shift
+		if byte < 0x80:
+			return value, position
+		shift += 7
@@ -0,0 +1,162 @@
+"""
+richtextpy.cache
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+from collections import OrderedDict
+from functools import wraps
+from inspect import getargspec
+from threading import Lock
+from type_utils import is_string
+
+# the cache used by the cached Delta methods, or None while caching is disabled
+current = None
+
+def set_cache(cache):
+	# start caching compose, transform and diff results in cache, or stop caching when cache is None
+	global current
+	current = cache
+
+def get_cache():
+	return current
+
+# limits of a ResultCache unless given others
+MAX_ENTRIES = 1024
+MAX_BYTES = 32 * 1024 * 1024
+MAX_OPS = 1000
+
+# rough number of bytes an op takes in the cache, besides the text it inserts
+OP_BYTES = 200
+
+class ResultCache(object):
+	# least recently used cache of operation results, holding at most max_entries results
+	# and, when max_bytes is set, at most that many bytes of results, estimated from their op counts and text lengths
+	# operations on a delta with more than max_ops ops, such as a whole document, skip the cache when max_ops is set,
+	# since storing and comparing their ops costs more than a hit is likely to save
+	def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, max_ops=MAX_OPS):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.max_ops = max_ops
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.bytes = 0
+		self._entries = OrderedDict()
+		self._lock = Lock()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key, default=None):
+		with self._lock:
+			try:
+				value, size = self._entries.pop(key)
+			except KeyError:
+				self.misses += 1
+				return default
+			# move the entry to the most recently used end
+			self._entries[key] = (value, size)
+			self.hits += 1
+			return value
+
+	def put(self, key, value, size):
+		with self._lock:
+			if key in self._entries:
+				self.bytes -= self._entries.pop(key)[1]
+			if (self.max_bytes != None) and (size > self.max_bytes):
+				return
+
+			self._entries[key] = (value, size)
+			self.bytes += size
+			while (len(self._entries) > self.max_entries) or ((self.max_bytes != None) and (self.bytes > self.max_bytes)):
+				self.bytes -= self._entries.popitem(last=False)[1][1]
+				self.evictions += 1
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.bytes = 0
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self._entries), 'bytes': self.bytes}
+
+
+class _FrozenDelta(object):
+	# a cached delta, held as its deeply frozen ops view and handed out as a new delta of the same class on every call
+	__slots__ = ('cls', 'ops')
+
+	def __init__(self, delta):
+		self.cls = type(delta)
+		self.ops = delta.get_ops_view()
+
+def cached(name):
+	# look up results of the decorated Delta method in the current cache, keyed on the method name,
+	# the fingerprints of both deltas and the remaining arguments, or just call it when caching is disabled
+	# different ops can share a fingerprint, so the ops of both deltas are stored with the result and compared on a hit
+	# results are stored frozen, and every call hands out a delta with its own ops, so changing one can't reach the cache
+	def decorator(func):
+		# arguments after the two deltas are keyed in order with defaults filled in, however they were passed
+		spec = getargspec(func)
+		names = spec.args[2:]
+		defaults = dict(zip(reversed(spec.args), reversed(spec.defaults or ())))
+
+		@wraps(func)
+		def wrapper(self, other, *args, **kwargs):
+			cache = current
+			if (cache is None) or not (_cacheable(cache, self) and _cacheable(cache, other)):
+				return func(self, other, *args, **kwargs)
+
+			arguments = args + tuple([kwargs.get(argument, defaults.get(argument)) for argument in names[len(args):]])
+			key = (name, fingerprint(self), fingerprint(other), arguments)
+			entry = cache.get(key)
+			if (entry is None) or not (_same_ops(self, entry[0]) and _same_ops(other, entry[1])):
+				entry = (self.get_ops_view(), other.get_ops_view(), _freeze(func(self, other, *args, **kwargs)))
+				cache.put(key, entry, _ops_size(entry[0]) + _ops_size(entry[1]) + _size(entry[2]))
+			return _thaw(entry[2])
+		return wrapper
+	return decorator
+
+def fingerprint(delta):
+	# key for the ops of a delta, the same for any two deltas with equal ops
+	# the delta keeps its fingerprint up to date as ops are pushed, so keying a delta again costs nothing,
+	# though as it isn't collision resistant, different ops can end up with the same key
+	return (delta.fingerprint(), len(delta.ops), delta.length())
+
+def _cacheable(cache, delta):
+	return (cache.max_ops is None) or (len(delta.ops) <= cache.max_ops)
+
+def _same_ops(delta, ops_view):
+	# whether the ops of delta equal the stored ops view, comparing as lists since a tuple never equals a list
+	ops = delta.ops
+	return (len(ops) == len(ops_view)) and (list(ops_view) == ops)
+
+def _freeze(result):
+	if isinstance(result, tuple):
+		return tuple([_freeze(value) for value in result])
+	elif hasattr(result, 'get_ops_view'):
+		return _FrozenDelta(result)
+	return result
+
+def _thaw(result):
+	if isinstance(result, tuple):
+		return tuple([_thaw(value) for value in result])
+	elif isinstance(result, _FrozenDelta):
+		# each op as an ordinary dict, the same as an uncached result, whose attributes and embeds are frozen too
+		return result.cls([dict(op) for op in result.ops])
+	return result
+
+def _size(result):
+	if isinstance(result, tuple):
+		return sum([_size(value) for value in result])
+	elif isinstance(result, _FrozenDelta):
+		return _ops_size(result.ops)
+	return 0
+
+def _ops_size(ops):
+	size = len(ops) * OP_BYTES
+	for op in ops:
+		value = op.get('insert')
+		if is_string(value):
+			size += len(value)
+	return size
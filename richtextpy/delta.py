@@ -4,53 +4,120 @@ richtextpy.delta
 Copyright (c) 2016 Sachin Rekhi
 """
 
+import time
 from copy import deepcopy
+from itertools import izip
 from diff_match_patch import diff_match_patch
-from type_utils import is_list, is_string, is_dict, is_number, INFINITY
-from op import op_length, op_insert_string, attr_compose, attr_transform, attr_diff
-from opiterator import OpIterator
+from type_utils import is_list, is_string, is_dict, is_number, freeze, TrackedList, INFINITY
+from op import op_copy, op_length, op_offsets, op_hashes, op_hash_step, op_insert_string, attr_compose, attr_transform, attr_diff, attr_invert, intern_attributes
+from opiterator import OpIterator, OpStreamIterator
+from instrument import instrumented
+from cache import cached
+import instrument
+import binary
 
 
 class Delta(object):
 	def __init__(self, ops=None):
-		# assume we are given well formed ops as a Delta instance, list of op dicts, or dict with ops key
+		# assume we are given well formed ops as a Delta instance, list of op dicts, ops view, or dict with ops key
 		if isinstance(ops, Delta):
-			self.ops = ops.ops
+			# copy the list (but not the ops) so pushing onto one delta can't change the other
+			self.ops = TrackedList(ops.ops)
+		elif isinstance(ops, tuple):
+			# ops from get_ops_view() can be adopted as they are, since pushing never modifies an op in place
+			self.ops = TrackedList(ops)
 		elif is_list(ops):
 			self.ops = ops
 		elif is_dict(ops) and is_list(ops.get('ops')):
 			self.ops = ops['ops']
 		else:
-			self.ops = []
+			self.ops = TrackedList()
+
+		self._invalidate()
+
+	@property
+	def ops(self):
+		return self._ops
+
+	@ops.setter
+	def ops(self, ops):
+		# ops are held in a TrackedList, which counts the changes made to it, so cached data derived from the ops
+		# can tell when they've been changed other than by pushing, and a plain list is copied into one
+		self._ops = ops if isinstance(ops, TrackedList) else TrackedList(ops)
 
 	def __eq__(self, other):
 		if type(other) is type(self):
-			return self.ops == other.ops
+			return self._same_ops(other)
 		else:
 			return False
 
 	def __ne__(self, other):
 		return not self.__eq__(other)
 
+	def _same_ops(self, other):
+		# deltas whose fingerprints are already known and differ can't be equal, so only compare ops when they match
+		self_hash = self._known_fingerprint()
+		other_hash = other._known_fingerprint()
+		if (self_hash != None) and (other_hash != None) and (self_hash != other_hash):
+			return False
+		return self._ops == other.ops
+
+	def fingerprint(self):
+		# hash of the ops, equal for any two deltas with equal ops in any process, and kept up to date as ops are pushed
+		# once it's been asked for, so unequal deltas can be told apart without comparing their ops
+		# different ops can share a fingerprint, though it's very unlikely, so equal fingerprints aren't proof of equal ops
+		if (self._cached_ops is not None) and not self._caches_valid():
+			self._invalidate()
+		if self._hashes is None:
+			self._hashes = op_hashes(self._ops)
+			self._remember_ops()
+		return self._hashes[-1]
+
+	def _known_fingerprint(self):
+		# the fingerprint if it's already been computed and is still current, otherwise None
+		if (self._hashes is not None) and self._caches_valid():
+			return self._hashes[-1]
+		return None
+
 	def get_ops(self):
-		return deepcopy(self.ops)
+		if instrument.counters != None:
+			instrument.counters['deepcopy'] += 1
+		return deepcopy(self._ops)
+
+	def get_ops_view(self):
+		# read only alternative to get_ops(), for callers that only inspect or serialize the ops
+		# returns a tuple of deeply frozen ops, which is cached until the ops change, so it can be handed to
+		# any number of readers and threads without copying
+		if (self._cached_ops is not None) and not self._caches_valid():
+			self._invalidate()
+		if self._ops_view is None:
+			self._ops_view = tuple([freeze(op) for op in self._ops])
+			self._remember_ops()
+		return self._ops_view
+
+	def to_bytes(self):
+		return binary.encode(self._ops)
+
+	@classmethod
+	def from_bytes(cls, data):
+		return cls(binary.decode(data))
 
 	def insert(self, value, attributes=None):
 		if is_string(value) and (len(value) == 0):
 			return self
 
-		insert_op = {'insert': value}
+		insert_op = {'insert': value if is_string(value) else freeze(value)}
 
 		if is_dict(attributes) and len(attributes) > 0:
-			insert_op['attributes'] = attributes
+			insert_op['attributes'] = intern_attributes(attributes)
 
-		return self.push(insert_op)
+		return self._push_owned(insert_op)
 
 	def delete(self, length):
 		if not is_number(length) or length <= 0:
 			return self
 
-		return self.push({'delete': length})
+		return self._push_owned({'delete': length})
 
 	def retain(self, length, attributes=None):
 		if not is_number(length) or length <= 0:
@@ -59,73 +126,208 @@ class Delta(object):
 		retain_op = {'retain': length}
 
 		if is_dict(attributes) and len(attributes) > 0:
-			retain_op['attributes'] = attributes
+			retain_op['attributes'] = intern_attributes(attributes)
 
-		return self.push(retain_op)
+		return self._push_owned(retain_op)
 
 	def push(self, op):
+		# op is supplied by the caller, so copy it to ensure later changes to it can't leak into this delta
+		if instrument.counters != None:
+			instrument.counters['deepcopy'] += 1
+		new_op = op_copy(op)
+		if new_op.get('attributes'):
+			new_op['attributes'] = intern_attributes(new_op['attributes'])
+		return self._push_owned(new_op)
+
+	def _push_owned(self, new_op):
 		# when adding an operation to this delta, ensure always end up with most compact possible representation
 		# this requires combining same operation types when possible
 		# and re-ordering same-index inserts and deletes to ensure canonical order
 
-		new_op = deepcopy(op)
+		# new_op is adopted without copying, so it must be an op nobody else will mutate, such as one freshly
+		# created by OpIterator.next() or op_copy(); its attributes and embed may be shared, as they're frozen
+
+		if (self._cached_ops is not None) and not self._caches_valid():
+			self._invalidate()
+
+		# the ops are changed through the plain list methods, which skip TrackedList's counting, and _ops_changed()
+		# counts the change once instead, as pushing is the most frequent operation of all
+		ops = self._ops
 
 		# if no existing ops, simply add new_op
-		if len(self.ops) == 0:
-			self.ops.append(new_op)
-			return self
+		if len(ops) == 0:
+			list.append(ops, new_op)
+			return self._ops_changed(0, new_op, True)
 		
-		new_index = len(self.ops)
-		last_op = self.ops[-1]
+		new_index = len(ops)
+		last_op = ops[-1]
 
 		# if new and last ops are both deletes, then combine
 		if ('delete' in new_op) and ('delete' in last_op):
-			self.ops[new_index - 1] = {'delete': last_op['delete'] + new_op['delete']}
-			return self
+			list.__setitem__(ops, new_index - 1, {'delete': last_op['delete'] + new_op['delete']})
+			return self._ops_changed(new_index - 1, new_op, False)
 
 		# since it does not matter if we insert before or after deleting at the same index, always prefer to insert first
 		# so swap if this situation arises
 		if ('delete' in last_op) and ('insert' in new_op):
 			new_index -= 1
 			if new_index - 1 < 0:
-				self.ops.insert(0, new_op)
-				return self
-			last_op = self.ops[new_index - 1]
+				list.insert(ops, 0, new_op)
+				return self._ops_changed(0, new_op, True)
+			last_op = ops[new_index - 1]
 
 		# if attributes match, can combine insert or retain ops
-		if new_op.get('attributes') == last_op.get('attributes'):
+		# interned attributes are usually the same instance, so check identity before comparing contents
+		new_attributes = new_op.get('attributes')
+		last_attributes = last_op.get('attributes')
+		if (new_attributes is last_attributes) or (new_attributes == last_attributes):
 			if is_string(new_op.get('insert')) and is_string(last_op.get('insert')):
-				self.ops[new_index - 1] = {'insert': last_op['insert'] + new_op['insert']}
-				if new_op.get('attributes'):
-					self.ops[new_index - 1]['attributes'] = new_op['attributes']
-				return self
+				merged_op = {'insert': last_op['insert'] + new_op['insert']}
 			elif ('retain' in new_op) and ('retain' in last_op):
-				self.ops[new_index - 1] = {'retain': last_op['retain'] + new_op['retain']}
-				if new_op.get('attributes'):
-					self.ops[new_index - 1]['attributes'] = new_op['attributes']
-				return self
-
-		self.ops.insert(new_index, new_op)
+				merged_op = {'retain': last_op['retain'] + new_op['retain']}
+			else:
+				merged_op = None
+
+			if merged_op is not None:
+				if new_attributes:
+					merged_op['attributes'] = new_attributes
+				list.__setitem__(ops, new_index - 1, merged_op)
+				return self._ops_changed(new_index - 1, new_op, False)
+
+		list.insert(ops, new_index, new_op)
+		return self._ops_changed(new_index, new_op, True)
+
+	def _ops_changed(self, index, new_op, inserted):
+		# bring cached data up to date after new_op was merged into, or inserted at, index
+		# push only ever touches the last couple of ops, so this is constant time
+		self._ops.version += 1
+		if instrument.counters != None:
+			instrument.counters['push_append' if inserted else 'push_merge'] += 1
+		if self._cached_ops is not None:
+			length = op_length(new_op)
+			if self._offsets is not None:
+				offsets = self._offsets
+				if inserted:
+					offsets.insert(index + 1, offsets[index])
+				for i in xrange(index + 1, len(offsets)):
+					offsets[i] += length
+			if self._length is not None:
+				self._length += length
+			if self._text_parts is not None:
+				# inserts only ever move ahead of deletes, which have no text, so new text always goes on the end
+				if 'insert' in new_op:
+					self._text_parts.append(op_insert_string(new_op))
+				else:
+					self._text_parts = None
+			if self._hashes is not None:
+				# hashes of the ops before index still hold, and only the ops after it need rehashing
+				hashes = self._hashes
+				del hashes[index + 1:]
+				for i in xrange(index, len(self._ops)):
+					hashes.append(op_hash_step(hashes[i], self._ops[i]))
+			self._ops_view = None
+			self._remember_ops()
 		return self
 
+	def _caches_valid(self):
+		# cached data is only trusted while the ops list is the same list, with no changes since the caches were last updated
+		# this catches every change made through the list, though not ops modified in place, which pushing never does
+		ops = self._ops
+		return (self._cached_ops is ops) and (self._cached_version == ops.version)
+
+	def _remember_ops(self):
+		ops = self._ops
+		self._cached_ops = ops
+		self._cached_version = ops.version
+
+	def _invalidate(self):
+		self._cached_ops = None
+		self._offsets = None
+		self._length = None
+		self._text_parts = None
+		self._ops_view = None
+		self._hashes = None
+		self._canonical_form = None
+
+	def _in_canonical_form(self):
+		# whether the ops are as pushing them one at a time would leave them, which ops built by pushing always are
+		# pushing keeps ops in canonical form, so once known this only needs checking again if the ops are changed otherwise
+		if (self._cached_ops is not None) and not self._caches_valid():
+			self._invalidate()
+		if self._canonical_form is None:
+			self._canonical_form = _in_canonical_form(self._ops)
+			self._remember_ops()
+		return self._canonical_form
+
+	def _position_index(self):
+		# lazily built prefix sums of op lengths, where ops[i] starts at position offsets[i]
+		if (self._cached_ops is not None) and not self._caches_valid():
+			self._invalidate()
+		if self._offsets is None:
+			self._offsets = op_offsets(self._ops)
+			self._remember_ops()
+		return self._offsets
+
 	def length(self):
-		return sum([op_length(op) for op in self.ops])
+		if (self._cached_ops is not None) and not self._caches_valid():
+			self._invalidate()
+		if self._length is None:
+			self._length = sum([op_length(op) for op in self._ops])
+			self._remember_ops()
+		return self._length
+
+	def _plain_text(self):
+		# text of a document with each embed as NULL_STRING, as used by diff
+		# pushed text is kept as separate pieces, which are only joined once the text is asked for
+		if (self._cached_ops is not None) and not self._caches_valid():
+			self._invalidate()
+		if self._text_parts is None:
+			self._text_parts = [op_insert_string(op) for op in self._ops]
+			self._remember_ops()
+		if len(self._text_parts) != 1:
+			self._text_parts = [''.join(self._text_parts)]
+		return self._text_parts[0]
 
 	def chop(self):
-		if (len(self.ops) > 0) and ('retain' in self.ops[-1]) and ('attributes' not in self.ops[-1]):
-			self.ops.pop()
+		if (len(self._ops) > 0) and ('retain' in self._ops[-1]) and ('attributes' not in self._ops[-1]):
+			if (self._cached_ops is not None) and self._caches_valid():
+				length = self._ops.pop()['retain']
+				if self._offsets is not None:
+					self._offsets.pop()
+				if self._length is not None:
+					self._length -= length
+				if self._hashes is not None:
+					self._hashes.pop()
+				self._ops_view = None
+				self._remember_ops()
+			else:
+				self._ops.pop()
+				self._invalidate()
 		return self
 
+	@instrumented('compose')
+	@cached('compose')
 	def compose(self, other):
-		self_iter = OpIterator(self.ops)
+		self_iter = OpIterator(self._ops)
 		other_iter = OpIterator(other.ops)
 		delta = Delta()
 
-		while self_iter.has_next() or other_iter.has_next():
+		# most changes start with a plain retain up to the edit, and composing with a plain retain leaves whole ops as
+		# they are, so copy the ops before the edit across with a slice rather than splitting and pushing each one
+		# ops copied this way aren't pushed, so this is only done when the ops of self are already in canonical form
+		canonical = self._in_canonical_form()
+		if canonical and (len(other.ops) > 0) and ('retain' in other.ops[0]) and not other.ops[0].get('attributes'):
+			index, position = _retained_prefix(self._ops, other.ops[0]['retain'])
+			if index > 0:
+				delta.ops = _compose_retained(self._ops[:index])
+				self_iter.skip(index)
+				other_iter.next(position)
+
+		while other_iter.has_next() or (self_iter.offset > 0):
 			if other_iter.peek_type() == 'insert':
-				delta.push(other_iter.next())
+				delta._push_owned(other_iter.next())
 			elif self_iter.peek_type() == 'delete':
-				delta.push(self_iter.next())
+				delta._push_owned(self_iter.next())
 			else:
 				length = min(self_iter.peek_length(), other_iter.peek_length())
 				self_op = self_iter.next(length)
@@ -141,14 +343,57 @@ class Delta(object):
 					attributes = attr_compose(self_op.get('attributes'), other_op.get('attributes'), True if ('retain' in self_op) else False)
 					if attributes != None:
 						new_op['attributes'] = attributes
-					delta.push(new_op)
+					delta._push_owned(new_op)
 				elif ('delete' in other_op) and ('retain' in self_op):
-					delta.push(other_op)
-		
-		return delta.chop()
+					delta._push_owned(other_op)
+
+		# past the end of other, the rest of self is composed with a plain retain, so it can be copied across the same way
+		# an insert pushed onto a trailing delete moves ahead of it, in which case the next op may combine with the delete
+		# ops of self not in canonical form are all pushed instead, so that they're combined the same as any others
+		rest = _compose_retained(self._ops[self_iter.index:])
+		if not canonical:
+			rest = [op_copy(op) for op in rest]
+		index = 0
+		while index < len(rest):
+			delta._push_owned(rest[index])
+			index += 1
+			if canonical and (('delete' not in delta._ops[-1]) or ('delete' in rest[index - 1])):
+				break
+		delta._ops.extend(rest[index:])
+
+		# every op is either pushed or copied from ops already in canonical form, so the result is too
+		delta.chop()
+		delta._canonical_form = True
+		delta._remember_ops()
+		return delta
 
+	@classmethod
+	def compose_stream(cls, self_ops, other_ops):
+		# generator composing two iterables of ops, such as generators reading from disk, yielding the ops of the result
+		# the result is the same as Delta(list(self_ops)).compose(Delta(list(other_ops))).ops, but neither the inputs
+		# nor the output are ever held in memory, only the current op of each input and the last couple output ops
+		return _canonical(_compose_ops(OpStreamIterator(self_ops), OpStreamIterator(other_ops)))
+
+	@classmethod
+	def compose_many(cls, deltas):
+		# compose a sequence of deltas in pairwise rounds, like a merge sort, instead of folding left to right
+		# folding re-walks the ever growing result for every delta, whereas each round here only walks each op once
+		deltas = list(deltas)
+		if len(deltas) == 0:
+			return cls()
+
+		while len(deltas) > 1:
+			composed = [deltas[i].compose(deltas[i + 1]) for i in xrange(0, len(deltas) - 1, 2)]
+			if len(deltas) % 2 == 1:
+				composed.append(deltas[-1])
+			deltas = composed
+
+		return cls(deltas[0])
+
+	@instrumented('transform')
+	@cached('transform')
 	def transform(self, other, priority=True):
-		self_iter = OpIterator(self.ops)
+		self_iter = OpIterator(self._ops)
 		other_iter = OpIterator(other.ops)
 		delta = Delta()
 
@@ -156,7 +401,7 @@ class Delta(object):
 			if self_iter.peek_type() == 'insert' and (priority or other_iter.peek_type() != 'insert'):
 				delta.retain(op_length(self_iter.next()))
 			elif other_iter.peek_type() == 'insert':
-				delta.push(other_iter.next())
+				delta._push_owned(other_iter.next())
 			else:
 				length = min(self_iter.peek_length(), other_iter.peek_length())
 				self_op = self_iter.next(length)
@@ -165,14 +410,53 @@ class Delta(object):
 				if 'delete' in self_op:
 					continue
 				elif 'delete' in other_op:
-					delta.push(other_op)
+					delta._push_owned(other_op)
 				else:
 					delta.retain(length, attr_transform(self_op.get('attributes'), other_op.get('attributes'), priority))
 
 		return delta.chop()
 
+	@classmethod
+	def transform_stream(cls, self_ops, other_ops, priority=True):
+		# generator version of transform over two iterables of ops, in the same way as compose_stream()
+		return _canonical(_transform_ops(OpStreamIterator(self_ops), OpStreamIterator(other_ops), priority))
+
+	def transform_x(self, other, priority=True):
+		# transform both deltas against each other in a single pass over their ops
+		# returns (other.transform(self, not priority), self.transform(other, priority)), in other words
+		# this delta transformed to apply after other, followed by other transformed to apply after this delta
+		self_iter = OpIterator(self._ops)
+		other_iter = OpIterator(other.ops)
+		self_delta = Delta()
+		other_delta = Delta()
+
+		while self_iter.has_next() or other_iter.has_next():
+			if self_iter.peek_type() == 'insert' and (priority or other_iter.peek_type() != 'insert'):
+				self_op = self_iter.next()
+				other_delta.retain(op_length(self_op))
+				self_delta._push_owned(self_op)
+			elif other_iter.peek_type() == 'insert':
+				other_op = other_iter.next()
+				self_delta.retain(op_length(other_op))
+				other_delta._push_owned(other_op)
+			else:
+				length = min(self_iter.peek_length(), other_iter.peek_length())
+				self_op = self_iter.next(length)
+				other_op = other_iter.next(length)
+
+				if 'delete' in self_op:
+					if 'retain' in other_op:
+						self_delta._push_owned(self_op)
+				elif 'delete' in other_op:
+					other_delta._push_owned(other_op)
+				else:
+					other_delta.retain(length, attr_transform(self_op.get('attributes'), other_op.get('attributes'), priority))
+					self_delta.retain(length, attr_transform(other_op.get('attributes'), self_op.get('attributes'), not priority))
+
+		return self_delta.chop(), other_delta.chop()
+
 	def transform_position(self, index, priority=True):
-		self_iter = OpIterator(self.ops)
+		self_iter = OpIterator(self._ops)
 		offset = 0
 
 		while self_iter.has_next() and (offset <= index):
@@ -188,20 +472,77 @@ class Delta(object):
 
 		return index
 
+	def transform_positions(self, indexes, priority=True):
+		# transform many positions in a single pass over the ops, instead of one pass per position
+		# each entry is either a position or a (start, end) range, and the results keep the same order and shape
+		positions = []
+		transformed = []
+		for i, index in enumerate(indexes):
+			if is_number(index):
+				transformed.append(index)
+				positions.append((index, i, None))
+			else:
+				transformed.append(list(index))
+				positions.append((index[0], i, 0))
+				positions.append((index[1], i, 1))
+
+		# negative positions are never moved, so leave them out of the sweep
+		positions = sorted([position for position in positions if position[0] >= 0])
+
+		def resolve(position, new_index):
+			if position[2] == None:
+				transformed[position[1]] = new_index
+			else:
+				transformed[position[1]][position[2]] = new_index
+
+		# offset is the position in the transformed document and base the matching position in the original one
+		# positions inside a deleted range collapse onto its start, which is why max(position, base) is used below
+		pending = 0
+		offset = 0
+		base = 0
+
+		for op in self._ops:
+			if pending >= len(positions):
+				break
+
+			length = op_length(op)
+			if 'delete' in op:
+				base += length
+			elif 'insert' in op:
+				# inserts at a position only move it when the other side has priority
+				if priority:
+					while (pending < len(positions)) and (positions[pending][0] <= base):
+						resolve(positions[pending], offset)
+						pending += 1
+				offset += length
+			else:
+				while (pending < len(positions)) and (positions[pending][0] < base + length):
+					resolve(positions[pending], offset + max(positions[pending][0], base) - base)
+					pending += 1
+				offset += length
+				base += length
+
+		for position in positions[pending:]:
+			resolve(position, offset + max(position[0], base) - base)
+
+		return [index if is_number(index) else tuple(index) for index in transformed]
+
 	def slice(self, start=0, end=None):
 		if end == None:
 			end = INFINITY
 		
 		delta = Delta()
-		self_iter = OpIterator(self.ops)
-		index = 0
+		self_iter = OpIterator(self._ops)
+		index = max(start, 0)
+
+		# jump straight to the op containing start instead of walking every op before it
+		if index > 0:
+			self_iter.offsets = self._position_index()
+			self_iter.seek(index)
 
 		while (index < end) and self_iter.has_next():
-			if (index < start):
-				next_op = self_iter.next(start - index)
-			else:
-				next_op = self_iter.next(end - index)
-				delta.push(next_op)
+			next_op = self_iter.next(end - index)
+			delta._push_owned(next_op)
 			index += op_length(next_op)
 
 		return delta
@@ -213,42 +554,252 @@ class Delta(object):
 			delta.ops.extend(other.ops[1:])
 		return delta
 
-	def diff(self, other):
+	def invert(self, base):
+		# returns the delta that undoes this one, where base is the document this delta was applied to
+		# only the ranges this delta deletes or formats are read from base, seeking straight to each of them
+		inverted = Delta()
+		base_iter = OpIterator(base.ops, base._position_index())
+		base_index = 0
+
+		for op in self._ops:
+			if 'insert' in op:
+				inverted.delete(op_length(op))
+			elif ('retain' in op) and not op.get('attributes'):
+				inverted.retain(op['retain'])
+				base_index += op['retain']
+			else:
+				end = base_index + op_length(op)
+				base_iter.seek(base_index)
+				while (base_index < end) and base_iter.has_next():
+					base_op = base_iter.next(end - base_index)
+					if 'delete' in op:
+						inverted._push_owned(base_op)
+					else:
+						inverted.retain(op_length(base_op), attr_invert(op['attributes'], base_op.get('attributes')))
+					base_index += op_length(base_op)
+				base_index = end
+
+		return inverted.chop()
+
+	def diff(self, other, timeout=None, max_cost=None):
+		return self.diff_with_status(other, timeout, max_cost)[0]
+
+	@instrumented('diff')
+	@cached('diff')
+	def diff_with_status(self, other, timeout=None, max_cost=None):
+		# returns (delta, minimal), where minimal is False if the diff had to fall back to a coarser result
+		# timeout is the number of seconds diff_match_patch may spend on the text, defaulting to its own Diff_Timeout
+		# max_cost bounds the size of the text diff, measured as the product of the lengths of the differing text
+		# whenever a budget is exceeded the result is still a correct diff, just not necessarily the smallest one
 		delta = Delta()
 
 		# first check if no diff
-		if (self.ops == other.ops):
-			return delta
-
-		self_string = ''.join([op_insert_string(op) for op in self.ops])
-		other_string = ''.join([op_insert_string(op) for op in other.ops])
+		if self._same_ops(other):
+			return delta, True
+
+		# identical ops at the start and end of both documents can only be retained, so only the ops between them need diffing
+		# only inserts are skipped, so diffing a non-document still raises below
+		self_ops = self._ops
+		other_ops = other._ops
+		prefix = 0
+		for self_op, other_op in izip(self_ops, other_ops):
+			if ('insert' not in self_op) or (self_op != other_op):
+				break
+			prefix += 1
+
+		suffix = 0
+		max_suffix = min(len(self_ops), len(other_ops)) - prefix
+		for self_op, other_op in izip(reversed(self_ops), reversed(other_ops)):
+			if (suffix >= max_suffix) or ('insert' not in self_op) or (self_op != other_op):
+				break
+			suffix += 1
+
+		self_end = len(self_ops) - suffix
+		other_end = len(other_ops) - suffix
+		self_offsets = self._position_index()
+		other_offsets = other._position_index()
+		delta.retain(self_offsets[prefix])
+
+		# text positions match document positions, so the text between the skipped ops can be cut from the cached text
+		self_string = self._plain_text()[self_offsets[prefix]:self_offsets[self_end]]
+		other_string = other._plain_text()[other_offsets[prefix]:other_offsets[other_end]]
+		self_ops = self_ops[prefix:self_end]
+		other_ops = other_ops[prefix:other_end]
+
+		self_iter = OpIterator(self_ops)
+		other_iter = OpIterator(other_ops)
+		minimal = True
+		if self_string == other_string:
+			# only formatting or embeds differ, so there's no need to diff the text
+			changes = [(diff_match_patch.DIFF_EQUAL, self_string)]
+		else:
+			changes, minimal = _diff_text(self_string, other_string, timeout, max_cost)
 
-		self_iter = OpIterator(self.ops)
-		other_iter = OpIterator(other.ops)
-		changes = diff_match_patch().diff_main(self_string, other_string)
 		for change in changes:
 			change_type = change[0]
 			length = len(change[1])
 
 			while length > 0:
-				op_length = 0
+				next_length = 0
 
 				if change_type == diff_match_patch.DIFF_INSERT:
-					op_length = min(other_iter.peek_length(), length)
-					delta.push(other_iter.next(op_length))
+					next_length = min(other_iter.peek_length(), length)
+					delta._push_owned(other_iter.next(next_length))
 				elif change_type == diff_match_patch.DIFF_DELETE:
-					op_length = min(length, self_iter.peek_length())
-					self_iter.next(op_length)
-					delta.delete(op_length)
+					next_length = min(length, self_iter.peek_length())
+					self_iter.next(next_length)
+					delta.delete(next_length)
 				elif change_type == diff_match_patch.DIFF_EQUAL:
-					op_length = min(self_iter.peek_length(), other_iter.peek_length(), length)
-					self_op = self_iter.next(op_length)
-					other_op = other_iter.next(op_length)
+					next_length = min(self_iter.peek_length(), other_iter.peek_length(), length)
+					self_op = self_iter.next(next_length)
+					other_op = other_iter.next(next_length)
 					if self_op['insert'] == other_op['insert']:
-						delta.retain(op_length, attr_diff(self_op.get('attributes'), other_op.get('attributes')))
+						delta.retain(next_length, attr_diff(self_op.get('attributes'), other_op.get('attributes')))
 					else:
-						delta.push(other_op).delete(op_length)
-
-				length -= op_length
+						delta._push_owned(other_op).delete(next_length)
+
+				length -= next_length
+
+		return delta.chop(), minimal
+
+def _retained_prefix(ops, length):
+	# returns (index, position), where ops[:index] are the whole ops covered by a retain of length at the start of a
+	# change, and position is how much of the retain they use up, which doesn't include deletes
+	index = 0
+	position = 0
+	count = len(ops)
+	while index < count:
+		op = ops[index]
+		if 'delete' not in op:
+			next_length = op_length(op)
+			if position + next_length > length:
+				break
+			position += next_length
+		index += 1
+	return index, position
+
+def _compose_retained(ops):
+	# ops composed with a plain retain, which only differ when compose would normalize their attributes
+	# a normalized op may then combine with its neighbours, so the ops from the first one changed on are pushed again
+	# other ops are shared with the delta they came from, as ops are never modified in place, and in canonical form
+	# their attributes are interned and any embed frozen, so they hold nothing that can be changed
+	for i in xrange(len(ops)):
+		op = ops[i]
+		attributes = op.get('attributes')
+		if (attributes is not None) and (attr_compose(attributes, None, 'retain' in op) is not attributes):
+			delta = Delta(ops[:i])
+			for op in ops[i:]:
+				new_op = op_copy(op)
+				if 'attributes' in new_op:
+					del new_op['attributes']
+					new_attributes = attr_compose(op['attributes'], None, 'retain' in op)
+					if new_attributes != None:
+						new_op['attributes'] = new_attributes
+				delta._push_owned(new_op)
+			return delta.ops
+	return ops
+
+def _in_canonical_form(ops):
+	# whether none of the ops would be combined with or moved ahead of the one before when pushed, as in Delta._push_owned(),
+	# and every embed is frozen, as push() and insert() leave them
+	last_op = None
+	for op in ops:
+		if ('insert' in op) and not is_string(op['insert']) and (freeze(op['insert']) is not op['insert']):
+			return False
+		if last_op is not None:
+			if 'delete' in last_op:
+				if ('delete' in op) or ('insert' in op):
+					return False
+			elif op.get('attributes') == last_op.get('attributes'):
+				if is_string(op.get('insert')) and is_string(last_op.get('insert')):
+					return False
+				if ('retain' in op) and ('retain' in last_op):
+					return False
+		last_op = op
+	return True
+
+def _compose_ops(self_iter, other_iter):
+	# generator of the ops of self composed with other, which still need pushing to combine them into canonical form
+	# this is the loop of Delta.compose(), which keeps its own copy as calling into a generator slows it down noticeably
+	while self_iter.has_next() or other_iter.has_next():
+		if other_iter.peek_type() == 'insert':
+			yield other_iter.next()
+		elif self_iter.peek_type() == 'delete':
+			yield self_iter.next()
+		else:
+			length = min(self_iter.peek_length(), other_iter.peek_length())
+			self_op = self_iter.next(length)
+			other_op = other_iter.next(length)
+			if 'retain' in other_op:
+				new_op = dict()
+				if 'retain' in self_op:
+					new_op['retain'] = length
+				else:
+					new_op['insert'] = self_op['insert']
+
+				# preserve nulls in attributes when composing with a retain, otherwise remove it for inserts
+				attributes = attr_compose(self_op.get('attributes'), other_op.get('attributes'), True if ('retain' in self_op) else False)
+				if attributes != None:
+					new_op['attributes'] = attributes
+				yield new_op
+			elif ('delete' in other_op) and ('retain' in self_op):
+				yield other_op
+
+def _transform_ops(self_iter, other_iter, priority):
+	# generator of the ops of other transformed against self, as in Delta.transform(), pushed the same way as _compose_ops()
+	while self_iter.has_next() or other_iter.has_next():
+		if self_iter.peek_type() == 'insert' and (priority or other_iter.peek_type() != 'insert'):
+			yield {'retain': op_length(self_iter.next())}
+		elif other_iter.peek_type() == 'insert':
+			yield other_iter.next()
+		else:
+			length = min(self_iter.peek_length(), other_iter.peek_length())
+			self_op = self_iter.next(length)
+			other_op = other_iter.next(length)
 
-		return delta.chop()
+			if 'delete' in self_op:
+				continue
+			elif 'delete' in other_op:
+				yield other_op
+			else:
+				new_op = {'retain': length}
+				attributes = attr_transform(self_op.get('attributes'), other_op.get('attributes'), priority)
+				if attributes:
+					new_op['attributes'] = attributes
+				yield new_op
+
+def _canonical(ops, chop=True):
+	# push ops as they're generated, yielding each one once it's final
+	# pushing only ever changes the last two ops, so anything before them won't change again
+	delta = Delta()
+	for op in ops:
+		delta._push_owned(op)
+		if len(delta.ops) > 2:
+			yield delta.ops.pop(0)
+
+	if chop:
+		delta.chop()
+	for op in delta.ops:
+		yield op
+
+def _diff_text(text1, text2, timeout, max_cost):
+	# returns (changes, minimal), diffing lines instead of characters, or replacing the text outright, when over budget
+	differ = diff_match_patch()
+	if timeout != None:
+		differ.Diff_Timeout = timeout
+
+	if (max_cost != None) and (len(text1) * len(text2) > max_cost):
+		if (text1.count('\n') + 1) * (text2.count('\n') + 1) > max_cost:
+			return [(diff_match_patch.DIFF_DELETE, text1), (diff_match_patch.DIFF_INSERT, text2)], False
+
+		chars1, chars2, lines = differ.diff_linesToChars(text1, text2)
+		changes = differ.diff_main(chars1, chars2, False)
+		differ.diff_charsToLines(changes, lines)
+		return changes, False
+
+	start = time.time()
+	changes = differ.diff_main(text1, text2)
+
+	# diff_match_patch quietly settles for a coarser diff once it runs out of time
+	minimal = (differ.Diff_Timeout <= 0) or (time.time() - start < differ.Diff_Timeout)
+	return changes, minimal
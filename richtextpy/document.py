@@ -0,0 +1,108 @@
+"""
+richtextpy.document
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import rope
+from delta import Delta
+from op import Op, op_length, attr_compose, intern_attributes, INSERT
+
+
+class Document(object):
+	# a document snapshot held as a balanced tree of op chunks
+	# applying a change only visits the parts of the tree the change touches, rather than every op of the document
+	# the tree holds its own compact copies of the ops, which are turned back into op dicts by to_delta()
+	def __init__(self, ops=None):
+		delta = ops if isinstance(ops, Delta) else Delta(ops)
+		compact_ops = []
+		for op in delta.ops:
+			if 'insert' not in op:
+				raise Exception('Document created from a non-document')
+			compact_ops.append(Op.from_dict(op))
+		self._root = rope.build(compact_ops)
+
+	def __eq__(self, other):
+		if type(other) is type(self):
+			return self.to_delta() == other.to_delta()
+		else:
+			return False
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def length(self):
+		return rope.length(self._root)
+
+	def get_ops(self):
+		return self.to_delta().get_ops()
+
+	def to_delta(self):
+		# leaves aren't combined with each other, so push every op to produce the canonical form
+		delta = Delta()
+		for op in rope.iter_ops(self._root):
+			delta._push_owned(op.to_dict())
+		return delta
+
+	def slice(self, start=0, end=None):
+		tree = self._root
+		if end != None:
+			tree, _ = rope.split(tree, end)
+		_, tree = rope.split(tree, start)
+		return Document._from_tree(tree).to_delta()
+
+	def apply(self, delta):
+		# equivalent to replacing this document with self.to_delta().compose(delta)
+		# a change that retains or deletes past the end of the document wouldn't leave a document, so raises ValueError
+		if not isinstance(delta, Delta):
+			delta = Delta(delta)
+		self._root = apply_to_tree(self._root, delta.ops)
+		return self
+
+	@classmethod
+	def _from_tree(cls, tree):
+		document = cls()
+		document._root = tree
+		return document
+
+def apply_to_tree(tree, ops):
+	# returns the tree of a document composed with the change ops, leaving the given tree as it was
+	# untouched ranges are moved across as whole subtrees, so the cost depends on the size of the change
+	if sum([op_length(op) for op in ops if 'insert' not in op]) > rope.length(tree):
+		raise ValueError('Change retains or deletes past the end of the document')
+
+	result = None
+	rest = tree
+	inserted = Delta()
+
+	for op in ops:
+		if 'insert' in op:
+			inserted.push(op)
+			continue
+
+		if len(inserted.ops) > 0:
+			result = rope.join(result, _build(inserted.ops))
+			inserted = Delta()
+
+		if 'delete' in op:
+			_, rest = rope.split(rest, op['delete'])
+		elif 'retain' in op:
+			kept, rest = rope.split(rest, op['retain'])
+			if (kept is not None) and op.get('attributes'):
+				kept = rope.build(_format(rope.iter_ops(kept), intern_attributes(op['attributes'])))
+			result = rope.join(result, kept)
+
+	if len(inserted.ops) > 0:
+		result = rope.join(result, _build(inserted.ops))
+
+	return rope.join(result, rest)
+
+def _build(ops):
+	return rope.build([Op.from_dict(op) for op in ops])
+
+def _format(ops, attributes):
+	# apply a retain's attributes to inserts, the same way compose does
+	formatted = []
+	for op in ops:
+		rope.append(formatted, Op(INSERT, op.length, op.value, attr_compose(op.attributes, attributes, False)))
+	return formatted
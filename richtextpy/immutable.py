@@ -0,0 +1,103 @@
+"""
+richtextpy.immutable
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import rope
+from delta import Delta
+from document import apply_to_tree
+from op import Op, op_length, INSERT
+
+
+class ImmutableDelta(object):
+	# a delta that never changes once created, so it can be shared between threads without locks or copies
+	# ops are held frozen in a balanced tree of op chunks, and every operation returns a new ImmutableDelta that
+	# shares the chunks it didn't touch with its inputs, so concat and slice cost O(log n) rather than O(n)
+	__slots__ = ('_root', '_document')
+
+	def __init__(self, ops=None):
+		if isinstance(ops, ImmutableDelta):
+			self._root = ops._root
+			self._document = ops._document
+			return
+
+		delta = ops if isinstance(ops, Delta) else Delta(ops)
+		ops = [Op.from_dict(op) for op in delta.ops]
+		self._root = rope.build(ops)
+		# whether every op is an insert, in which case compose can splice the tree like Document.apply does
+		self._document = all([op.type == INSERT for op in ops])
+
+	def __eq__(self, other):
+		if type(other) is type(self):
+			return self.to_delta() == other.to_delta()
+		else:
+			return False
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def length(self):
+		return rope.length(self._root)
+
+	def get_ops(self):
+		return self.to_delta().get_ops()
+
+	def get_ops_view(self):
+		return self.to_delta().get_ops_view()
+
+	def to_delta(self):
+		# ops are split across chunks that aren't combined with each other, so push each one to get the canonical form
+		delta = Delta()
+		for op in rope.iter_ops(self._root):
+			delta._push_owned(op.to_dict())
+		return delta
+
+	def insert(self, value, attributes=None):
+		return self._append(Delta().insert(value, attributes))
+
+	def delete(self, length):
+		return self._append(Delta().delete(length))
+
+	def retain(self, length, attributes=None):
+		return self._append(Delta().retain(length, attributes))
+
+	def push(self, op):
+		return self._append(Delta().push(op))
+
+	def concat(self, other):
+		other = ImmutableDelta(other)
+		return ImmutableDelta._from_tree(rope.join(self._root, other._root), self._document and other._document)
+
+	def slice(self, start=0, end=None):
+		tree = self._root
+		if end != None:
+			tree, _ = rope.split(tree, end)
+		_, tree = rope.split(tree, start)
+		return ImmutableDelta._from_tree(tree, self._document)
+
+	def compose(self, other):
+		# when this is a document, the change is spliced into the tree so everything it doesn't touch stays shared
+		# splicing only keeps the parts of the change that fall within the document, so a change that retains or
+		# deletes past its end, which compose keeps, is composed the regular way
+		if self._document:
+			ops = [op.to_dict() for op in rope.iter_ops(other._root)] if isinstance(other, ImmutableDelta) else Delta(other).ops
+			if sum([op_length(op) for op in ops if 'insert' not in op]) <= self.length():
+				return ImmutableDelta._from_tree(apply_to_tree(self._root, ops), True)
+		return ImmutableDelta(self.to_delta().compose(_to_delta(other)))
+
+	def transform(self, other, priority=True):
+		return ImmutableDelta(self.to_delta().transform(_to_delta(other), priority))
+
+	def _append(self, delta):
+		return self.concat(ImmutableDelta(delta))
+
+	@classmethod
+	def _from_tree(cls, tree, document):
+		immutable = cls()
+		immutable._root = tree
+		immutable._document = document
+		return immutable
+
+def _to_delta(value):
+	return value.to_delta() if isinstance(value, ImmutableDelta) else Delta(value)
@@ -0,0 +1,82 @@
+"""
+richtextpy.instrument
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import time
+from functools import wraps
+from type_utils import is_list, is_dict, is_string
+
+# registered listeners, each called as listener(event) after every instrumented call
+listeners = []
+
+# counts of push merges and appends and of deep copies, or None while counting is disabled
+counters = None
+
+def add_listener(listener):
+	# events are dicts with the operation name, its wall time in seconds, the number of input and output ops,
+	# and the number of bytes of text inserted by the output
+	listeners.append(listener)
+
+def remove_listener(listener):
+	listeners.remove(listener)
+
+def enable_counters():
+	global counters
+	counters = {'push_append': 0, 'push_merge': 0, 'deepcopy': 0}
+
+def disable_counters():
+	global counters
+	counters = None
+
+def get_counters():
+	return dict(counters) if counters != None else None
+
+def instrumented(name):
+	# report calls of the decorated function to the listeners, or just call it when there are none
+	def decorator(func):
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			if len(listeners) == 0:
+				return func(*args, **kwargs)
+
+			start = time.time()
+			result = func(*args, **kwargs)
+			event = {
+				'operation': name,
+				'seconds': time.time() - start,
+				'input_ops': _count_ops(args),
+				'output_ops': _count_ops([result]),
+				'insert_bytes': _insert_bytes([result]),
+			}
+			for listener in list(listeners):
+				listener(event)
+			return result
+		return wrapper
+	return decorator
+
+def _ops_of(values):
+	# the op lists among the given arguments or results, which may be deltas, op lists, dicts with ops, or tuples of those
+	for value in values:
+		if isinstance(value, tuple):
+			for ops in _ops_of(value):
+				yield ops
+		elif is_list(getattr(value, 'ops', None)):
+			yield value.ops
+		elif is_list(value):
+			yield value
+		elif is_dict(value) and is_list(value.get('ops')):
+			yield value['ops']
+
+def _count_ops(values):
+	return sum([len(ops) for ops in _ops_of(values)])
+
+def _insert_bytes(values):
+	total = 0
+	for ops in _ops_of(values):
+		for op in ops:
+			value = op.get('insert')
+			if is_string(value):
+				total += len(value.encode('utf-8')) if isinstance(value, unicode) else len(value)
+	return total
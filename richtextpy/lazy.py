@@ -0,0 +1,112 @@
+"""
+richtextpy.lazy
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+from itertools import chain
+from delta import Delta, _canonical
+from op import op_length
+from opiterator import OpStreamIterator
+
+
+class LazyDelta(object):
+	# a delta expression that's only evaluated once its ops are asked for
+	# compose, transform, slice and concat build up the expression, without computing any intermediate deltas
+	#
+	# chained compositions are merged into a single node, which to_delta() evaluates with Delta.compose_many
+	# a slice of a slice becomes one slice, and slices are evaluated by streaming the ops of the expression beneath
+	# them, so the ops after the end of the slice are never computed
+	def __init__(self, delta=None):
+		# delta is the value of this node once known, which for a leaf is the delta it wraps
+		self._delta = Delta(delta)
+		self._operation = None
+		self._operands = []
+		self._args = ()
+
+	def compose(self, other):
+		operands = []
+		for value in [self, _lazy(other)]:
+			if value._operation == 'compose':
+				operands.extend(value._operands)
+			else:
+				operands.append(value)
+		return LazyDelta._node('compose', operands)
+
+	def transform(self, other, priority=True):
+		return LazyDelta._node('transform', [self, _lazy(other)], priority)
+
+	def slice(self, start=0, end=None):
+		start = max(start, 0)
+		if self._operation != 'slice':
+			return LazyDelta._node('slice', [self], start, end)
+
+		# a slice of a slice is a single slice of the expression beneath them
+		outer_start, outer_end = self._args
+		if end == None:
+			end = outer_end
+		else:
+			end += outer_start
+			if outer_end != None:
+				end = min(end, outer_end)
+		return LazyDelta._node('slice', self._operands, outer_start + start, end)
+
+	def concat(self, other):
+		return LazyDelta._node('concat', [self, _lazy(other)])
+
+	def to_delta(self):
+		# evaluate the expression, keeping the result so it's only ever evaluated once
+		if self._delta is None:
+			if self._operation == 'compose':
+				self._delta = Delta.compose_many([operand.to_delta() for operand in self._operands])
+			else:
+				self._delta = Delta(list(self.iter_ops()))
+		return Delta(self._delta)
+
+	def get_ops(self):
+		return self.to_delta().get_ops()
+
+	def length(self):
+		return self.to_delta().length()
+
+	def iter_ops(self):
+		# generator of the ops of the expression, in canonical form, computing each op only when it's needed
+		if self._delta is not None:
+			return iter(self._delta.ops)
+
+		operands = self._operands
+		if self._operation == 'compose':
+			ops = operands[0].iter_ops()
+			for operand in operands[1:]:
+				ops = Delta.compose_stream(ops, operand.iter_ops())
+			return ops
+		elif self._operation == 'transform':
+			return Delta.transform_stream(operands[0].iter_ops(), operands[1].iter_ops(), self._args[0])
+		elif self._operation == 'slice':
+			return _canonical(_slice_ops(operands[0].iter_ops(), self._args[0], self._args[1]), False)
+		else:
+			return _canonical(chain(operands[0].iter_ops(), operands[1].iter_ops()), False)
+
+	@classmethod
+	def _node(cls, operation, operands, *args):
+		node = cls()
+		node._delta = None
+		node._operation = operation
+		node._operands = operands
+		node._args = args
+		return node
+
+def _lazy(value):
+	return value if isinstance(value, LazyDelta) else LazyDelta(value)
+
+def _slice_ops(ops, start, end):
+	# the same as Delta.slice(), but over a stream of ops, which it stops reading as soon as it reaches end
+	iterator = OpStreamIterator(ops)
+	index = 0
+	while (index < start) and iterator.has_next():
+		index += op_length(iterator.next(start - index))
+
+	while ((end == None) or (index < end)) and iterator.has_next():
+		next_op = iterator.next(end - index if end != None else None)
+		index += op_length(next_op)
+		yield next_op
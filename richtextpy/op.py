@@ -4,8 +4,84 @@ richtextpy.op
 Copyright (c) 2016 Sachin Rekhi
 """
 
-from copy import deepcopy
-from type_utils import is_dict, is_string, NULL_STRING
+from functools import wraps
+from hashlib import md5
+from inspect import getargspec, getcallargs
+from type_utils import is_dict, is_string, freeze, NULL_STRING
+
+INSERT = 'insert'
+DELETE = 'delete'
+RETAIN = 'retain'
+
+# bounds on the number of interned attribute sets and of memoized attribute results
+ATTRIBUTES_CACHE_SIZE = 4096
+
+# ops are hashed as a polynomial in HASH_BASE modulo the Mersenne prime HASH_MODULUS
+HASH_MODULUS = (1 << 61) - 1
+HASH_BASE = 0x1f3d5b79a2c4e687 % HASH_MODULUS
+
+_interned_attributes = dict()
+_interned_ids = set()
+
+
+class Op(object):
+	# compact representation of a single op, used by the trees Document and ImmutableDelta hold documents in
+	# a plain op dict carries a hash table per op, while this stores the same data in four fixed slots
+	# value and attributes are frozen, and ops are never modified once created, so they can be shared freely
+	__slots__ = ('type', 'length', 'value', 'attributes')
+
+	def __init__(self, type, length, value=None, attributes=None):
+		self.type = type
+		self.length = length
+		self.value = value
+		self.attributes = attributes
+
+	def __eq__(self, other):
+		if isinstance(other, Op):
+			return (self.type == other.type) and (self.length == other.length) and (self.value == other.value) and (self.attributes == other.attributes)
+		else:
+			return False
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __repr__(self):
+		return 'Op(%r, %r, %r, %r)' % (self.type, self.length, self.value, self.attributes)
+
+	@classmethod
+	def from_dict(cls, op):
+		attributes = op.get('attributes')
+		if attributes is not None:
+			attributes = freeze(attributes)
+		if 'insert' in op:
+			value = op['insert']
+			if is_string(value):
+				return cls(INSERT, len(value), value, attributes)
+			return cls(INSERT, 1, freeze(value), attributes)
+		elif 'delete' in op:
+			return cls(DELETE, op['delete'], None, attributes)
+		return cls(RETAIN, op['retain'], None, attributes)
+
+	def to_dict(self):
+		# a new op dict, sharing only the frozen value and attributes
+		op = {self.type: self.value if self.type == INSERT else self.length}
+		if self.attributes is not None:
+			op['attributes'] = self.attributes
+		return op
+
+	def slice(self, start, end=None):
+		if end == None:
+			end = self.length
+		value = self.value[start:end] if is_string(self.value) else self.value
+		return Op(self.type, end - start, value, self.attributes)
+
+def op_type(op):
+	if 'insert' in op:
+		return INSERT
+	elif 'delete' in op:
+		return DELETE
+	elif 'retain' in op:
+		return RETAIN
 
 def op_length(op):
 	if 'insert' in op:
@@ -15,6 +91,63 @@ def op_length(op):
 	elif 'retain' in op:
 		return op['retain']
 
+def op_copy(op):
+	# copy of op sharing nothing that can be changed with it, so it can be adopted by a delta without the
+	# original reaching it; attributes and embeds are frozen rather than copied, which costs nothing once they are
+	new_op = dict(op)
+	if 'attributes' in op:
+		new_op['attributes'] = freeze(op['attributes'])
+	if ('insert' in op) and not is_string(op['insert']):
+		new_op['insert'] = freeze(op['insert'])
+	return new_op
+
+def op_offsets(ops):
+	# prefix sums of op lengths, where ops[i] starts at offsets[i] and offsets[-1] is the total length
+	offsets = [0]
+	total = 0
+	for op in ops:
+		total += op_length(op)
+		offsets.append(total)
+	return offsets
+
+def op_hash(op):
+	# hash of an op that's the same for any two equal ops, such as a text insert given as str or unicode
+	# it's taken from a digest of the op's canonical encoding rather than hash(), which varies between processes
+	# with PYTHONHASHSEED and between 32 and 64 bit builds, so fingerprints can be compared and stored across processes
+	return int(md5(_hash_encoding(op)).hexdigest()[:16], 16) % HASH_MODULUS
+
+def op_hash_step(prefix_hash, op):
+	# hash of a list of ops from the hash of all but its last op, and that last op
+	return (prefix_hash * HASH_BASE + op_hash(op) + 1) % HASH_MODULUS
+
+def op_hashes(ops):
+	# prefix hashes of ops, where hashes[i] is the hash of ops[:i] and hashes[-1] is the hash of all of them
+	hashes = [0]
+	for op in ops:
+		hashes.append(op_hash_step(hashes[-1], op))
+	return hashes
+
+def _hash_encoding(value):
+	# the same bytes for any two equal JSON like values: numbers are encoded by value, so 1, 1.0 and True match,
+	# strings as UTF-8, so str and unicode match, and dict items in sorted order
+	# strings, lists and dicts are prefixed with their length, so the encodings of their items can't run together
+	if is_string(value):
+		if isinstance(value, unicode):
+			value = value.encode('utf-8')
+		return 's%d:%s' % (len(value), value)
+	elif is_dict(value):
+		items = sorted([_hash_encoding(key) + _hash_encoding(item) for key, item in value.iteritems()])
+		return 'd%d:%s' % (len(items), ''.join(items))
+	elif isinstance(value, (list, tuple)):
+		return 'l%d:%s' % (len(value), ''.join([_hash_encoding(item) for item in value]))
+	elif isinstance(value, float) and not value.is_integer():
+		return 'f%r;' % value
+	elif isinstance(value, (bool, int, long, float)):
+		return 'i%d;' % value
+	elif value is None:
+		return 'n'
+	return 'r%r;' % (value,)
+
 def op_insert_string(op):
 	if 'insert' in op:
 		if is_string(op['insert']):
@@ -24,13 +157,80 @@ def op_insert_string(op):
 
 	raise Exception('Diff called on a non-document')
 
+def intern_attributes(attributes):
+	# documents tend to reuse a handful of formats, so share a single frozen instance between identical attribute sets
+	# this lets equal attributes compare by identity and avoids holding a separate copy per op
+	if not attributes:
+		return None
+	if id(attributes) in _interned_ids:
+		# already interned, and interned instances are never released, so their ids can't be reused
+		return attributes
+
+	try:
+		key = _intern_key(attributes)
+		interned = _interned_attributes.get(key)
+	except TypeError:
+		# unhashable attribute values can't be interned, so fall back to a private copy
+		return freeze(attributes)
+
+	if interned is not None:
+		return interned
+	frozen = freeze(attributes)
+	if len(_interned_attributes) < ATTRIBUTES_CACHE_SIZE:
+		_interned_attributes[key] = frozen
+		_interned_ids.add(id(frozen))
+	return frozen
+
+def _intern_key(value):
+	# 1, 1.0 and True are equal and hash the same, but serialize differently, so numbers are keyed along with their type
+	# to keep {'header': 1} from being interned as {'header': True}, and nested dicts and lists are keyed the same way
+	if is_dict(value):
+		return frozenset([(key, _intern_key(item)) for key, item in value.iteritems()])
+	elif isinstance(value, (list, tuple)):
+		return tuple([_intern_key(item) for item in value])
+	elif isinstance(value, (bool, int, long, float)):
+		return (type(value), value)
+	return value
+
+def _memoize(func):
+	# cache results per argument tuple, which is cheap when the attributes are interned
+	# arguments are keyed by identity as well as value, since equal attribute sets with values of different types
+	# are interned separately and must not share results, and the key holds on to the arguments so their ids stay unique
+	# plain dict arguments aren't hashable, so those calls simply bypass the cache
+	results = dict()
+	names = getargspec(func).args
+
+	@wraps(func)
+	def memoized(*args, **kwargs):
+		if kwargs:
+			# key keyword arguments by position, so they share results with the same call made positionally
+			call_args = getcallargs(func, *args, **kwargs)
+			args = tuple([call_args[name] for name in names])
+
+		try:
+			key = (args, tuple(map(id, args)))
+			return results[key]
+		except KeyError:
+			pass
+		except TypeError:
+			return func(*args)
+
+		result = func(*args)
+		if len(results) >= ATTRIBUTES_CACHE_SIZE:
+			results.clear()
+		results[key] = result
+		return result
+
+	return memoized
+
+@_memoize
 def attr_compose(a, b, keep_null):
 	if not is_dict(a):
 		a = dict()
 	if not is_dict(b):
 		b = dict()
 
-	attributes = deepcopy(b)
+	attributes = dict(b)
 	if not keep_null:
 		for key in attributes.keys():
 			if attributes[key] == None:
@@ -41,17 +241,18 @@ def attr_compose(a, b, keep_null):
 			attributes[key] = a[key]
 	
 	if len(attributes.keys()) > 0:
-		return attributes
+		return intern_attributes(attributes)
 	else:
 		return None
 
+@_memoize
 def attr_transform(a, b, priority=True):
 	if a == None:
-		return b
+		return intern_attributes(b)
 	if b == None:
 		return None
 	if not priority:
-		return b
+		return intern_attributes(b)
 
 	attributes = dict()
 	for key in b.keys():
@@ -59,10 +260,11 @@ def attr_transform(a, b, priority=True):
 			attributes[key] = b[key]
 	
 	if len(attributes.keys()) > 0:
-		return attributes
+		return intern_attributes(attributes)
 	else:
 		return None
 
+@_memoize
 def attr_diff(a, b):
 	if a == None:
 		a = dict()
@@ -77,6 +279,28 @@ def attr_diff(a, b):
 			attributes[key] = None if b.get(key) == None else b[key]
 
 	if len(attributes) > 0:
-		return attributes
+		return intern_attributes(attributes)
+	else:
+		return None
+
+@_memoize
+def attr_invert(attributes, base):
+	# attributes that undo formatting a range that had the base attributes with attributes
+	if attributes == None:
+		attributes = dict()
+	if base == None:
+		base = dict()
+
+	inverted = dict()
+	for key in base.keys():
+		if (key in attributes) and (base[key] != attributes[key]):
+			inverted[key] = base[key]
+
+	for key in attributes.keys():
+		if (key not in base) and (attributes[key] != None):
+			inverted[key] = None
+
+	if len(inverted) > 0:
+		return intern_attributes(inverted)
 	else:
 		return None
@@ -4,15 +4,29 @@ richtextpy.opiterator
 Copyright (c) 2016 Sachin Rekhi
 """
 
-from op import op_length
-from type_utils import is_string, INFINITY
+from bisect import bisect_right
+from op import op_length, op_offsets, op_type, INSERT, DELETE, RETAIN
+from type_utils import is_string, freeze, INFINITY
 
 
 class OpIterator(object):
-	def __init__(self, ops):	
+	def __init__(self, ops, offsets=None):	
 		self.ops = ops
+		# optional prefix sums of op lengths for ops, as built by op_offsets(), used by seek()
+		self.offsets = offsets
 		self.index = 0
 		self.offset = 0
+		self._load()
+
+	def _load(self):
+		# cache the type and length of the current op so repeated peeks don't keep inspecting the op dict
+		if self.index < len(self.ops):
+			next_op = self.ops[self.index]
+			self._type = op_type(next_op)
+			self._length = op_length(next_op)
+		else:
+			self._type = RETAIN
+			self._length = INFINITY
 
 	def has_next(self):
 		return self.peek_length() < INFINITY
@@ -23,49 +37,88 @@ class OpIterator(object):
 
 		if self.index < len(self.ops):
 			next_op = self.ops[self.index]
+			next_type = self._type
 			offset = self.offset
-			next_op_length = op_length(next_op)
+			next_op_length = self._length
 
 			if (length >= next_op_length - offset):
 				length = next_op_length - offset
 				self.index += 1
 				self.offset = 0
+				self._load()
 			else:
 				self.offset += length
 
+			# the op returned shares nothing that can be changed with next_op, as in op_copy(), so it can be pushed as it is
 			return_op = dict()
 			if 'attributes' in next_op:
-				return_op['attributes'] = next_op['attributes']
+				return_op['attributes'] = freeze(next_op['attributes'])
 			
-			if 'delete' in next_op:
+			if next_type == DELETE:
 				return_op['delete'] = length
-			elif 'retain' in next_op:
+			elif next_type == RETAIN:
 				return_op['retain'] = length
-			elif 'insert' in next_op:
+			elif next_type == INSERT:
 				if is_string(next_op['insert']):
 					return_op['insert'] = next_op['insert'][offset:offset+length]
 				else:
-					return_op['insert'] = next_op['insert']
+					return_op['insert'] = freeze(next_op['insert'])
 
 			return return_op
 		else:
 			return {'retain': INFINITY}
 
 	def peek_length(self):
-		if self.index < len(self.ops):
-			# should never return 0 if our index is being managed correctly
-			return op_length(self.ops[self.index]) - self.offset
-		else:
-			return INFINITY
+		# should never return 0 if our index is being managed correctly
+		return self._length - self.offset
 
 	def peek_type(self):
-		if self.index < len(self.ops):
-			next_op = self.ops[self.index]
-			if 'insert' in next_op:
-				return 'insert'
-			elif 'delete' in next_op:
-				return 'delete'
-			elif 'retain' in next_op:
-				return 'retain'
+		return self._type
+
+	def skip(self, count):
+		# move past the next count ops, where the current op hasn't been partly consumed
+		self.index += count
+		self.offset = 0
+		self._load()
+
+	def seek(self, position):
+		# move to position within the ops, using binary search over the prefix sums rather than walking each op
+		if self.offsets is None:
+			self.offsets = op_offsets(self.ops)
+
+		index = bisect_right(self.offsets, position) - 1
+		if index < 0:
+			self.index = 0
+			self.offset = 0
+		elif index >= len(self.ops):
+			self.index = len(self.ops)
+			self.offset = 0
 		else:
-			return 'retain'
+			self.index = index
+			self.offset = position - self.offsets[index]
+		self._load()
+
+
+class OpStreamIterator(OpIterator):
+	# iterates over ops from any iterable, such as a generator reading ops from disk, holding only the current op
+	# the ops are consumed as the iterator advances, so unlike OpIterator it can't seek
+	def __init__(self, ops):
+		self._source = iter(ops)
+		OpIterator.__init__(self, [])
+
+	def _load(self):
+		# ops only ever holds the current op, which is replaced by the next one from the source once it's used up
+		if self.index >= len(self.ops):
+			self.ops = []
+			self.index = 0
+			for next_op in self._source:
+				self.ops.append(next_op)
+				break
+		OpIterator._load(self)
+
+	def skip(self, count):
+		for i in xrange(count):
+			self.next()
+
+	def seek(self, position):
+		raise Exception('Cannot seek within a stream of ops')
@@ -0,0 +1,152 @@
+"""
+richtextpy.rope
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+from op import Op, INSERT
+from type_utils import is_string
+
+# maximum number of ops held by a single leaf
+LEAF_SIZE = 64
+
+
+class Node(object):
+	# a node of a height balanced (AVL) tree over a sequence of ops, split into leaves of at most LEAF_SIZE ops
+	# leaves hold compact Op instances rather than op dicts, as a tree can hold a whole large document
+	# nodes are never modified once created, so trees can share subtrees with each other freely
+	__slots__ = ('left', 'right', 'ops', 'length', 'count', 'height')
+
+	def __init__(self, left, right, ops, length, count, height):
+		self.left = left
+		self.right = right
+		self.ops = ops
+		self.length = length
+		self.count = count
+		self.height = height
+
+def leaf(ops):
+	return Node(None, None, ops, sum([op.length for op in ops]), len(ops), 1)
+
+def node(left, right):
+	return Node(left, right, None, left.length + right.length, left.count + right.count, max(left.height, right.height) + 1)
+
+def build(ops):
+	# build a balanced tree over a list of Op instances, or None if there are no ops
+	leaves = [leaf(ops[i:i+LEAF_SIZE]) for i in xrange(0, len(ops), LEAF_SIZE)]
+	return _build(leaves, 0, len(leaves))
+
+def _build(leaves, start, end):
+	if start >= end:
+		return None
+	if end - start == 1:
+		return leaves[start]
+	middle = (start + end) // 2
+	return node(_build(leaves, start, middle), _build(leaves, middle, end))
+
+def length(tree):
+	return tree.length if tree is not None else 0
+
+def iter_ops(tree):
+	# yield the Op instances of the tree in order, without recursion
+	stack = []
+	while (tree is not None) or (len(stack) > 0):
+		if tree is not None:
+			if tree.ops is not None:
+				for op in tree.ops:
+					yield op
+				tree = None
+			else:
+				stack.append(tree.right)
+				tree = tree.left
+		else:
+			tree = stack.pop()
+
+def join(left, right):
+	# concatenate two trees, rebalancing along the seam so this costs O(height difference)
+	if left is None:
+		return right
+	if right is None:
+		return left
+
+	if left.height > right.height + 1:
+		return _balance(node(left.left, join(left.right, right)))
+	if right.height > left.height + 1:
+		return _balance(node(join(left, right.left), right.right))
+
+	# combine neighboring small leaves so repeated edits don't fragment the tree into tiny leaves
+	if (left.ops is not None) and (right.ops is not None) and (left.count + right.count <= LEAF_SIZE):
+		return leaf(_merge_ops(left.ops, right.ops))
+
+	return node(left, right)
+
+def split(tree, position):
+	# split a tree into the ops before position and the ops from position onwards
+	if tree is None:
+		return None, None
+	if position <= 0:
+		return None, tree
+	if position >= tree.length:
+		return tree, None
+
+	if tree.ops is not None:
+		left_ops, right_ops = _split_ops(tree.ops, position)
+		return leaf(left_ops), leaf(right_ops)
+
+	if position < tree.left.length:
+		left, right = split(tree.left, position)
+		return left, join(right, tree.right)
+	elif position == tree.left.length:
+		return tree.left, tree.right
+	else:
+		left, right = split(tree.right, position - tree.left.length)
+		return join(tree.left, left), right
+
+def _balance(tree):
+	# restore the height invariant of a node whose children differ in height by at most two
+	left = tree.left
+	right = tree.right
+
+	if left.height > right.height + 1:
+		if left.left.height >= left.right.height:
+			return node(left.left, node(left.right, right))
+		return node(node(left.left, left.right.left), node(left.right.right, right))
+
+	if right.height > left.height + 1:
+		if right.right.height >= right.left.height:
+			return node(node(left, right.left), right.right)
+		return node(node(left, right.left.left), node(right.left.right, right.right))
+
+	return tree
+
+def append(ops, op):
+	# append op to a list of ops, combining it with the last op when pushing onto a delta would
+	# inserts aren't moved ahead of deletes, as Document and ImmutableDelta push every op when converting to a delta
+	if len(ops) > 0:
+		last_op = ops[-1]
+		if (last_op.type == op.type) and (last_op.attributes == op.attributes):
+			if op.type != INSERT:
+				ops[-1] = Op(op.type, last_op.length + op.length, None, op.attributes)
+				return ops
+			if is_string(op.value) and is_string(last_op.value):
+				ops[-1] = Op(INSERT, last_op.length + op.length, last_op.value + op.value, op.attributes)
+				return ops
+	ops.append(op)
+	return ops
+
+def _merge_ops(left_ops, right_ops):
+	# append the first right op so it's combined with the last left op when possible
+	ops = append(list(left_ops), right_ops[0])
+	ops.extend(right_ops[1:])
+	return ops
+
+def _split_ops(ops, position):
+	# ops before position move across whole, and only an op straddling position is split in two
+	index = 0
+	while position >= ops[index].length:
+		position -= ops[index].length
+		index += 1
+	if position == 0:
+		return ops[:index], ops[index:]
+	op = ops[index]
+	return ops[:index] + [op.slice(0, position)], [op.slice(position)] + ops[index + 1:]
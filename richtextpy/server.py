@@ -0,0 +1,148 @@
+"""
+richtextpy.server
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import json
+import os
+from bisect import bisect_right
+from threading import Lock
+from delta import Delta
+from document import Document
+from op import op_length
+from type_utils import freeze
+
+
+class MemoryStore(object):
+	# op log kept in memory, where the op at index i takes the document from version i to version i + 1
+	# alongside it are snapshot checkpoints, each holding the ops of the whole document at some version
+	# ops are stored frozen, so nothing done to the ops passed in, or to deltas built from the stored ops, can change them
+	def __init__(self):
+		self._log = []
+		self._checkpoint_versions = []
+		self._checkpoints = dict()
+
+	def __len__(self):
+		return len(self._log)
+
+	def append(self, ops):
+		self._log.append(freeze(ops))
+
+	def get_ops(self, start, end=None):
+		return self._log[start:end]
+
+	def put_checkpoint(self, version, ops):
+		if version not in self._checkpoints:
+			self._checkpoint_versions.insert(bisect_right(self._checkpoint_versions, version), version)
+		self._checkpoints[version] = freeze(ops)
+
+	def get_checkpoint(self, version):
+		# returns (checkpoint_version, ops) for the latest checkpoint at or before version, or (0, []) if there is none
+		index = bisect_right(self._checkpoint_versions, version)
+		if index == 0:
+			return 0, []
+		checkpoint_version = self._checkpoint_versions[index - 1]
+		return checkpoint_version, self._checkpoints[checkpoint_version]
+
+
+class FileStore(MemoryStore):
+	# op log persisted to a file with one JSON encoded list of ops per line, and read back when reopened
+	# checkpoints are kept the same way in a second file next to it, as JSON encoded [version, ops] pairs
+	def __init__(self, path):
+		super(FileStore, self).__init__()
+		self.path = path
+		self.checkpoint_path = path + '.checkpoints'
+		for ops in _read_lines(path):
+			super(FileStore, self).append(ops)
+		for version, ops in _read_lines(self.checkpoint_path):
+			super(FileStore, self).put_checkpoint(version, ops)
+
+	def append(self, ops):
+		with open(self.path, 'a') as f:
+			f.write(json.dumps(ops) + '\n')
+		super(FileStore, self).append(ops)
+
+	def put_checkpoint(self, version, ops):
+		with open(self.checkpoint_path, 'a') as f:
+			f.write(json.dumps([version, ops]) + '\n')
+		super(FileStore, self).put_checkpoint(version, ops)
+
+
+class OTDocument(object):
+	# server side of the OT protocol for a single document
+	# clients submit ops against the version they last saw, and each op is rebased onto the ops committed since
+	# a snapshot checkpoint is stored every checkpoint_interval ops or checkpoint_bytes bytes of JSON encoded ops,
+	# whichever comes first, so older versions can be rebuilt without composing the log from the start
+	# set either to None to not checkpoint on that basis
+	def __init__(self, store=None, checkpoint_interval=100, checkpoint_bytes=None):
+		self.store = store if store != None else MemoryStore()
+		self.checkpoint_interval = checkpoint_interval
+		self.checkpoint_bytes = checkpoint_bytes
+		self._lock = Lock()
+		self._snapshot = Document(self.version_at(self.version))
+
+		checkpoint_version = self.store.get_checkpoint(self.version)[0]
+		self._ops_since_checkpoint = self.version - checkpoint_version
+		self._bytes_since_checkpoint = sum([len(json.dumps(ops)) for ops in self.store.get_ops(checkpoint_version)])
+
+	@property
+	def version(self):
+		return len(self.store)
+
+	def get_snapshot(self):
+		# the document holds its own frozen copies of the ops, and to_delta() builds new op dicts from them every call
+		return self._snapshot.to_delta()
+
+	def get_ops(self, start, end=None):
+		return [Delta(ops) for ops in self.store.get_ops(start, end)]
+
+	def version_at(self, version):
+		# rebuild the document as of version, composing forward from the nearest earlier checkpoint
+		if (version < 0) or (version > self.version):
+			raise ValueError('Unknown version %s' % version)
+
+		checkpoint_version, checkpoint_ops = self.store.get_checkpoint(version)
+		return Delta.compose_many([Delta(checkpoint_ops)] + self.get_ops(checkpoint_version, version))
+
+	def submit(self, op, base_version):
+		# returns (version, op), where op is the submitted op transformed to apply at version,
+		# which is what should be broadcast to the other clients
+		op = op if isinstance(op, Delta) else Delta(op)
+
+		with self._lock:
+			if (base_version < 0) or (base_version > self.version):
+				raise ValueError('Op submitted against unknown version %s' % base_version)
+
+			# committed ops have priority, the same as transform(op, committed_op, 'left') in the type interface
+			# each committed op is transformed against in turn, rather than against their composition,
+			# since composing first changes how ties between inserts resolve and clients transform op by op
+			for committed in self.store.get_ops(base_version):
+				op = Delta(committed).transform(op, True)
+
+			# an op reaching past the end of the document would leave a non-document in the log, which couldn't be reopened
+			if sum([op_length(next_op) for next_op in op.ops if 'insert' not in next_op]) > self._snapshot.length():
+				raise ValueError('Op submitted retains or deletes past the end of the document')
+
+			version = self.version
+			self._snapshot.apply(op)
+			ops = op.get_ops()
+			self.store.append(ops)
+			self._checkpoint(ops)
+			return version, op
+
+	def _checkpoint(self, ops):
+		self._ops_since_checkpoint += 1
+		self._bytes_since_checkpoint += len(json.dumps(ops))
+		if ((self.checkpoint_interval != None) and (self._ops_since_checkpoint >= self.checkpoint_interval)) or \
+			((self.checkpoint_bytes != None) and (self._bytes_since_checkpoint >= self.checkpoint_bytes)):
+			self.store.put_checkpoint(self.version, self._snapshot.get_ops())
+			self._ops_since_checkpoint = 0
+			self._bytes_since_checkpoint = 0
+
+def _read_lines(path):
+	if os.path.exists(path):
+		with open(path) as f:
+			for line in f:
+				if line.strip():
+					yield json.loads(line)
@@ -5,6 +5,8 @@ Copyright (c) 2016 Sachin Rekhi
 """
 
 from delta import Delta
+from instrument import instrumented
+import cache
 
 name = 'rich-text'
 uri = 'http://github.com/sachinrekhi/richtextpy'
@@ -12,6 +14,7 @@ uri = 'http://github.com/sachinrekhi/richtextpy'
 def create(initial_ops):
 	return Delta(initial_ops)
 
+@instrumented('apply')
 def apply(snapshot_ops, delta_ops):
 	snapshot = Delta(snapshot_ops)
 	delta = Delta(delta_ops)
@@ -22,6 +25,9 @@ def compose(delta1_ops, delta2_ops):
 	delta2 = Delta(delta2_ops)
 	return delta1.compose(delta2)
 
+def compose_many(deltas_ops):
+	return Delta.compose_many([Delta(delta_ops) for delta_ops in deltas_ops])
+
 def diff(delta1_ops, delta2_ops):
 	delta1 = Delta(delta1_ops)
 	delta2 = Delta(delta2_ops)
@@ -32,3 +38,15 @@ def transform(delta1_ops, delta2_ops, side):
 	delta2 = Delta(delta2_ops)
 	# fuzzer specs is in opposite order of delta interface
 	return delta2.transform(delta1, True if side == 'left' else False)
+
+def transformX(left_ops, right_ops):
+	# returns (left transformed by right, right transformed by left) in a single pass, as ShareJS expects
+	left = Delta(left_ops)
+	right = Delta(right_ops)
+	return left.transform_x(right, False)
+
+def set_cache(result_cache):
+	# cache the results of apply, compose, diff and transform, which are shared with the Delta methods behind them,
+	# in a cache.ResultCache, or stop caching when result_cache is None
+	# documents longer than the cache's max_ops, such as snapshots being applied to, are never cached
+	cache.set_cache(result_cache)
@@ -4,6 +4,8 @@ richtextpy.type_utils
 Copyright (c) 2016 Sachin Rekhi
 """
 
+from copy import deepcopy
+
 INFINITY = float('inf')
 NULL_STRING = chr(0)
 
@@ -18,3 +20,99 @@ def is_dict(value):
 
 def is_number(value):
 	return isinstance(value, (int, long, float))
+
+
+class FrozenDict(dict):
+	# immutable dict, so a single instance can be safely shared and used as a dictionary key
+	__slots__ = ('_hash',)
+
+	def __hash__(self):
+		try:
+			return self._hash
+		except AttributeError:
+			self._hash = hash(frozenset(self.iteritems()))
+			return self._hash
+
+	def _immutable(self, *args, **kwargs):
+		raise TypeError('FrozenDict does not support modification')
+
+	__setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+	# copies are made to be modified, so hand back a regular dict
+	def __copy__(self):
+		return dict(self)
+
+	def __deepcopy__(self, memo):
+		return deepcopy(dict(self), memo)
+
+	def __reduce__(self):
+		return (FrozenDict, (dict(self),))
+
+class FrozenList(list):
+	# immutable list, the counterpart of FrozenDict, which still compares equal to a regular list of the same items
+	__slots__ = ('_hash',)
+
+	def __hash__(self):
+		try:
+			return self._hash
+		except AttributeError:
+			self._hash = hash(tuple(self))
+			return self._hash
+
+	def _immutable(self, *args, **kwargs):
+		raise TypeError('FrozenList does not support modification')
+
+	__setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _immutable
+	append = extend = insert = pop = remove = reverse = sort = _immutable
+
+	def __copy__(self):
+		return list(self)
+
+	def __deepcopy__(self, memo):
+		return deepcopy(list(self), memo)
+
+	def __reduce__(self):
+		return (FrozenList, (list(self),))
+
+class TrackedList(list):
+	# list that counts the changes made to it, so data derived from its contents can tell whether it's still current
+	version = 0
+
+	def _tracked(method):
+		def tracked(self, *args, **kwargs):
+			self.version += 1
+			return method(self, *args, **kwargs)
+		tracked.__name__ = method.__name__
+		return tracked
+
+	__setitem__ = _tracked(list.__setitem__)
+	__delitem__ = _tracked(list.__delitem__)
+	__setslice__ = _tracked(list.__setslice__)
+	__delslice__ = _tracked(list.__delslice__)
+	__iadd__ = _tracked(list.__iadd__)
+	__imul__ = _tracked(list.__imul__)
+	append = _tracked(list.append)
+	extend = _tracked(list.extend)
+	insert = _tracked(list.insert)
+	pop = _tracked(list.pop)
+	remove = _tracked(list.remove)
+	reverse = _tracked(list.reverse)
+	sort = _tracked(list.sort)
+	del _tracked
+
+	def __copy__(self):
+		return list(self)
+
+	def __deepcopy__(self, memo):
+		return deepcopy(list(self), memo)
+
+def freeze(value):
+	# deep immutable copy of a JSON like value, turning dicts into FrozenDicts and lists into FrozenLists
+	# FrozenDicts are already frozen all the way down, as they're only ever built by this, which interning also uses
+	if isinstance(value, FrozenDict):
+		return value
+	elif is_dict(value):
+		return FrozenDict([(key, freeze(item)) for key, item in value.iteritems()])
+	elif isinstance(value, (list, tuple)):
+		return FrozenList([freeze(item) for item in value])
+	return value
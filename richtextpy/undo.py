@@ -0,0 +1,83 @@
+"""
+richtextpy.undo
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import time
+
+
+class UndoManager(object):
+	# undo and redo stacks for the local changes made to a document, along the lines of Quill's history module
+	# each stack entry is a dict of the 'undo' and 'redo' deltas for one or more changes, so undoing never needs a diff
+	# changes recorded within delay seconds of the start of the last entry are composed into it, and each stack
+	# keeps at most max_stack entries, dropping the oldest ones first
+	def __init__(self, delay=1.0, max_stack=100):
+		self.delay = delay
+		self.max_stack = max_stack
+		self.stack = {'undo': [], 'redo': []}
+		self.last_recorded = 0
+
+	def record(self, change, base, timestamp=None):
+		# record a local change, where base is the document the change was applied to
+		if len(change.ops) == 0:
+			return
+		if timestamp == None:
+			timestamp = time.time()
+
+		self.stack['redo'] = []
+		undo = change.invert(base)
+		redo = change
+
+		if (self.last_recorded + self.delay > timestamp) and (len(self.stack['undo']) > 0):
+			last = self.stack['undo'].pop()
+			undo = undo.compose(last['undo'])
+			redo = last['redo'].compose(redo)
+		else:
+			self.last_recorded = timestamp
+
+		self.stack['undo'].append({'undo': undo, 'redo': redo})
+		if len(self.stack['undo']) > self.max_stack:
+			self.stack['undo'].pop(0)
+
+	def cutoff(self):
+		# start a new entry with the next recorded change, however soon it comes
+		self.last_recorded = 0
+
+	def clear(self):
+		self.stack = {'undo': [], 'redo': []}
+		self.last_recorded = 0
+
+	def transform(self, delta):
+		# rebase both stacks onto a change made by someone else, which was applied to the document after them
+		_transform_stack(self.stack['undo'], delta)
+		_transform_stack(self.stack['redo'], delta)
+
+	def undo(self):
+		# returns the delta to apply to the document to undo the last entry, or None if there's nothing to undo
+		return self._change('undo', 'redo')
+
+	def redo(self):
+		return self._change('redo', 'undo')
+
+	def _change(self, source, dest):
+		if len(self.stack[source]) == 0:
+			return None
+		entry = self.stack[source].pop()
+		self.stack[dest].append(entry)
+		self.last_recorded = 0
+		return entry[source]
+
+def _transform_stack(stack, delta):
+	# walk back from the newest entry, moving the remote change to apply before each entry in turn
+	# the remote change goes first when transforming the entries, while the entries go first when moving the change
+	remote = delta
+	for i in xrange(len(stack) - 1, -1, -1):
+		entry = stack[i]
+		stack[i] = {
+			'undo': remote.transform(entry['undo'], True),
+			'redo': remote.transform(entry['redo'], True),
+		}
+		remote = entry['undo'].transform(remote, False)
+		if len(stack[i]['undo'].ops) == 0:
+			del stack[i]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+richtextpy.tests.test_binary
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import json
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy import binary
+
+
+class TestBinary(TestCase):
+	def test_round_trip(self):
+		delta = Delta().insert('hello', {'bold': True}).insert(u'w\xf6rld ☃').insert({'image': 'https://octodex.github.com/images/labtocat.png'}, {'alt': 'Lab Octocat'}).retain(300, {'color': '#cc0000', 'bold': None}).retain(2).delete(70000)
+		self.assertEqual(Delta.from_bytes(delta.to_bytes()), delta)
+		self.assertEqual(Delta.from_bytes(Delta().to_bytes()), Delta())
+
+	def test_round_trip_dicts(self):
+		ops = [
+			{'insert': 'a', 'attributes': {'link': {'href': 'http://example.com', 'target': '_blank'}}},
+			{'insert': 'b', 'attributes': {'bold': True}},
+			{'retain': 1, 'attributes': {'bold': True}},
+			{'delete': 1},
+		]
+		self.assertEqual(binary.decode(binary.encode(ops)), ops)
+
+		# equal attribute values of different types keep their types
+		ops = Delta().insert('a', {'header': True}).insert('b', {'header': 1}).insert('c', {'header': 1.0}).insert('d', {'header': True}).ops
+		self.assertEqual(json.dumps(binary.decode(binary.encode(ops))), json.dumps(ops))
+
+	def test_smaller_than_json(self):
+		delta = Delta()
+		for i in xrange(100):
+			delta.retain(i + 1).insert('word', {'bold': True, 'color': 'red'}).delete(i + 1)
+		self.assertTrue(len(delta.to_bytes()) < len(json.dumps(delta.ops)) / 2)
+
+	def test_encode_many(self):
+		ops_list = [
+			Delta().insert('abc', {'bold': True}).ops,
+			Delta().retain(1).insert('d', {'bold': True}).ops,
+			[],
+			Delta().retain(2).retain(1, {'bold': None}).ops,
+		]
+		data = binary.encode_many(ops_list)
+		self.assertEqual(list(binary.decode_many(data)), ops_list)
+
+		# the repeated attribute set is only written out once
+		self.assertEqual(data.count('"bold":true'), 1)
+
+		encoder = binary.Encoder()
+		for ops in ops_list:
+			encoder.write(ops)
+		self.assertEqual(encoder.getvalue(), data)
+
+		with self.assertRaises(ValueError):
+			binary.decode(data)
+
+	def test_invalid(self):
+		with self.assertRaises(ValueError):
+			Delta.from_bytes('{"ops": []}')
+
+		data = bytearray(Delta().insert('a').to_bytes())
+		data[len(binary.MAGIC)] = binary.VERSION + 1
+		with self.assertRaises(ValueError):
+			Delta.from_bytes(str(data))
+
+		# buffers cut short anywhere
+		data = Delta().insert('hello', {'bold': True}).insert({'image': 'https://octodex.github.com/images/labtocat.png'}).retain(300).delete(2).to_bytes()
+		for length in xrange(len(data)):
+			with self.assertRaises(ValueError):
+				Delta.from_bytes(data[:length])
+
+		# and lengths that can't be encoded
+		for length in [2.5, 2.0, True]:
+			with self.assertRaises(ValueError):
+				binary.encode([{'retain': length}])
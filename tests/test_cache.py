@@ -0,0 +1,138 @@
+"""
+richtextpy.tests.test_cache
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy import cache, type
+from richtextpy.cache import ResultCache
+
+
+class TestCache(TestCase):
+	def tearDown(self):
+		cache.set_cache(None)
+
+	def test_result_cache(self):
+		results = ResultCache(max_entries=2)
+		results.put('a', 1, 10)
+		results.put('b', 2, 10)
+		self.assertEqual(results.get('a'), 1)
+		results.put('c', 3, 10)
+		self.assertEqual(results.get('b'), None)
+		self.assertEqual(results.get('c'), 3)
+		self.assertEqual(results.stats(), {'hits': 2, 'misses': 1, 'evictions': 1, 'entries': 2, 'bytes': 20})
+
+		results = ResultCache(max_bytes=25)
+		results.put('a', 1, 10)
+		results.put('b', 2, 10)
+		results.put('c', 3, 10)
+		self.assertEqual(len(results), 2)
+		self.assertEqual(results.get('a'), None)
+		results.put('d', 4, 30)
+		self.assertEqual(results.get('d'), None)
+		results.clear()
+		self.assertEqual(results.stats()['bytes'], 0)
+
+	def test_cached_methods(self):
+		results = ResultCache()
+		cache.set_cache(results)
+
+		a = Delta().insert('abc', {'bold': True})
+		b = Delta().retain(1).delete(1).insert('x')
+		composed = a.compose(b)
+		self.assertEqual(composed, Delta().insert('a', {'bold': True}).insert('x').insert('c', {'bold': True}))
+		self.assertEqual(Delta(a.get_ops()).compose(Delta(b.get_ops())), composed)
+		self.assertEqual(results.stats()['hits'], 1)
+
+		# priority and the other arguments are part of the key
+		cache.set_cache(None)
+		c = Delta().insert('x')
+		expected = [a.transform(b, True), c.transform(a, True), c.transform(a, False), a.diff_with_status(composed)]
+		cache.set_cache(results)
+		self.assertEqual(a.transform(b, True), expected[0])
+		self.assertEqual(c.transform(a, True), expected[1])
+		self.assertEqual(c.transform(a, False), expected[2])
+		self.assertEqual(c.transform(a, False), expected[2])
+		self.assertNotEqual(expected[1], expected[2])
+		self.assertEqual(a.diff(composed), expected[3][0])
+		self.assertEqual(a.diff_with_status(composed), expected[3])
+		self.assertEqual(results.stats()['hits'], 3)
+		self.assertEqual(results.stats()['misses'], 5)
+
+		# results handed out have ordinary ops of their own, so changing them doesn't reach the cache
+		result = a.compose(b)
+		result.insert('!')
+		result.ops[0]['insert'] = 'z'
+		with self.assertRaises(TypeError):
+			result.ops[0]['attributes']['bold'] = False
+		self.assertEqual(a.compose(b), composed)
+
+		# embeds and attributes are frozen, the same as in uncached results
+		embed = Delta().insert({'image': {'src': 'a.png', 'size': [1, 2]}}, {'link': {'href': 'x'}})
+		for i in xrange(2):
+			result = embed.compose(Delta().retain(1).insert('x'))
+			self.assertIs(result.ops[0].__class__, dict)
+			result.ops[0]['insert'] = {'image': 'b.png'}
+			with self.assertRaises(TypeError):
+				embed.compose(Delta().retain(1).insert('x')).ops[0]['insert']['image']['size'].append(3)
+			with self.assertRaises(TypeError):
+				result.ops[0]['attributes']['link']['href'] = 'y'
+		self.assertEqual(embed.compose(Delta().retain(1).insert('x')).ops[0]['insert'], {'image': {'src': 'a.png', 'size': [1, 2]}})
+
+		cache.set_cache(None)
+		self.assertEqual(a.compose(b), composed)
+		self.assertEqual(results.stats()['hits'], 9)
+
+	def test_limits(self):
+		results = ResultCache(max_ops=2)
+		self.assertEqual(results.max_bytes, cache.MAX_BYTES)
+		cache.set_cache(results)
+
+		# entries are sized from the op counts and text of both deltas and the result
+		a = Delta().insert('abc')
+		b = Delta().retain(3).insert('d', {'bold': True})
+		for i in xrange(2):
+			self.assertEqual(a.compose(b), Delta().insert('abc').insert('d', {'bold': True}))
+		self.assertEqual(results.stats()['bytes'], 5 * cache.OP_BYTES + 8)
+		self.assertEqual(results.stats()['hits'], 1)
+
+		# deltas with more ops than max_ops skip the cache
+		c = Delta().insert('a').insert('b', {'bold': True}).insert('c')
+		for i in xrange(2):
+			self.assertEqual(c.compose(Delta().retain(3).insert('x')), Delta().insert('a').insert('b', {'bold': True}).insert('cx'))
+			self.assertEqual(a.compose(c), Delta().insert('a').insert('b', {'bold': True}).insert('cabc'))
+		self.assertEqual(results.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 5 * cache.OP_BYTES + 8})
+
+		results.max_ops = None
+		c.compose(Delta().retain(3).insert('x'))
+		self.assertEqual(len(results), 2)
+
+	def test_colliding_keys(self):
+		results = ResultCache()
+		cache.set_cache(results)
+		fingerprint = cache.fingerprint
+		cache.fingerprint = lambda delta: 0
+		try:
+			# deltas with the same key but different ops don't share results
+			a = Delta().insert('a')
+			b = Delta().insert('b')
+			self.assertEqual(a.compose(Delta().retain(1).insert('x')), Delta().insert('ax'))
+			self.assertEqual(b.compose(Delta().retain(1).insert('x')), Delta().insert('bx'))
+			self.assertEqual(a.compose(Delta().retain(1).insert('x')), Delta().insert('ax'))
+			self.assertEqual(a.compose(Delta().retain(1).insert('y')), Delta().insert('ay'))
+			self.assertEqual(Delta().insert('a').compose(Delta().retain(1).insert('y')), Delta().insert('ay'))
+			self.assertEqual(len(results), 1)
+		finally:
+			cache.fingerprint = fingerprint
+
+	def test_type(self):
+		results = ResultCache()
+		type.set_cache(results)
+		for i in xrange(3):
+			self.assertEqual(type.transform([{'insert': 'a'}], [{'insert': 'b'}], 'left'), Delta().retain(1).insert('a'))
+			self.assertEqual(type.apply([{'insert': 'a'}], [{'retain': 1}, {'insert': 'b'}]), Delta().insert('ab'))
+		self.assertEqual(results.stats()['misses'], 2)
+		self.assertEqual(results.stats()['hits'], 4)
+		self.assertIs(cache.get_cache(), results)
@@ -4,8 +4,12 @@ richtextpy.tests.test_delta
 Copyright (c) 2016 Sachin Rekhi
 """
 
+import json
+import random
 from unittest import TestCase
+from diff_match_patch import diff_match_patch
 from richtextpy import Delta
+from test_document import random_document, random_change
 
 
 class TestDelta(TestCase):
@@ -106,6 +110,81 @@ class TestDelta(TestCase):
 		delta.retain(15, {'bold': True})
 		self.assertEqual(delta.get_ops(), [{'retain': 15, 'attributes': {'bold': True}}])
 
+	def test_push(self):
+		# caller supplied ops are copied
+		op = {'insert': 'hello', 'attributes': {'bold': True}}
+		delta = Delta().push(op)
+		op['insert'] = 'world'
+		op['attributes']['bold'] = False
+		self.assertEqual(delta.get_ops(), [{'insert': 'hello', 'attributes': {'bold': True}}])
+
+		attributes = {'bold': True}
+		delta = Delta().insert('hello', attributes).retain(3, attributes)
+		attributes['bold'] = False
+		self.assertEqual(delta.get_ops(), [{'insert': 'hello', 'attributes': {'bold': True}}, {'retain': 3, 'attributes': {'bold': True}}])
+
+		embed = {'image': 'https://octodex.github.com/images/labtocat.png'}
+		delta = Delta().insert(embed)
+		embed['image'] = 'whoops'
+		self.assertEqual(delta.get_ops(), [{'insert': {'image': 'https://octodex.github.com/images/labtocat.png'}}])
+
+		# ops created by the library are adopted without a copy
+		delta = Delta().insert('hello')
+		op = {'insert': ' world'}
+		delta._push_owned(op)
+		self.assertEqual(delta.get_ops(), [{'insert': 'hello world'}])
+		op = {'retain': 3}
+		delta._push_owned(op)
+		self.assertIs(delta.ops[-1], op)
+
+		# results share no attributes or embeds that can be changed with the deltas they were made from
+		b = Delta([{'insert': {'image': 'a.png'}, 'attributes': {'link': {'href': 'x'}}}, {'insert': 'bc', 'attributes': {'bold': True}}])
+		results = [Delta().compose(b), b.compose(Delta().retain(1).insert('x')), b.compose(Delta().retain(2).delete(1)), b.slice(0, 2), Delta().transform(b, True), Delta().insert('z').diff(b)]
+		for result in results:
+			embed = [op for op in result.ops if op.get('insert') == {'image': 'a.png'}][0]
+			with self.assertRaises(TypeError):
+				embed['insert']['image'] = 'evil.png'
+			with self.assertRaises(TypeError):
+				embed['attributes']['link']['href'] = 'y'
+		self.assertEqual(b.ops, [{'insert': {'image': 'a.png'}, 'attributes': {'link': {'href': 'x'}}}, {'insert': 'bc', 'attributes': {'bold': True}}])
+
+	def test_get_ops_view(self):
+		delta = Delta().insert('hello', {'bold': True}).insert({'image': 'https://octodex.github.com/images/labtocat.png', 'size': [1, 2]}).retain(3)
+		view = delta.get_ops_view()
+		self.assertEqual(list(view), delta.get_ops())
+		self.assertIs(delta.get_ops_view(), view)
+		self.assertEqual(json.loads(json.dumps(view)), delta.get_ops())
+
+		# nothing in the view can be modified
+		with self.assertRaises(TypeError):
+			view[0]['insert'] = 'world'
+		with self.assertRaises(TypeError):
+			view[0]['attributes']['bold'] = False
+		with self.assertRaises(TypeError):
+			view[1]['insert']['image'] = 'whoops'
+		with self.assertRaises(TypeError):
+			view[1]['insert']['size'].append(3)
+
+		# including nested attributes
+		linked = Delta().insert('hello', {'link': {'href': 'https://octodex.github.com'}})
+		with self.assertRaises(TypeError):
+			linked.get_ops_view()[0]['attributes']['link']['href'] = 'whoops'
+
+		# changes to the delta produce a new view
+		delta.insert('!')
+		self.assertEqual(list(delta.get_ops_view()), delta.get_ops())
+		self.assertEqual(len(view), 3)
+		delta.chop()
+		self.assertEqual(list(delta.get_ops_view()), delta.get_ops())
+		delta.ops.append({'delete': 1})
+		self.assertEqual(delta.get_ops_view()[-1], {'delete': 1})
+
+		# a view can be turned back into a delta, which can be changed without affecting the view
+		copy = Delta(view)
+		self.assertEqual(copy.ops, list(view))
+		copy.insert('world')
+		self.assertEqual(view[-1], {'retain': 3})
+
 	def test_simple_combines(self):
 		delta = Delta().insert('hello ').insert('world')
 		self.assertEqual(delta.get_ops(), [{'insert': 'hello world'}])
@@ -167,6 +246,102 @@ class TestDelta(TestCase):
 		delta = Delta().insert('hello').insert({'image': 'https://octodex.github.com/images/labtocat.png'}, {'alt': 'Lab Octocat'})
 		self.assertEqual(delta.length(), 6)
 
+	def test_cached_length_and_text(self):
+		delta = Delta().insert('hello').delete(3)
+		self.assertEqual(delta.length(), 8)
+		self.assertEqual(delta._length, 8)
+
+		# kept up to date by push and chop
+		delta.insert(' world', {'bold': True}).retain(4)
+		self.assertEqual(delta._length, 18)
+		delta.chop()
+		self.assertEqual(delta._length, 14)
+		self.assertEqual(delta.length(), 14)
+
+		# and recomputed after the ops are changed directly
+		delta.ops.append({'retain': 2})
+		self.assertEqual(delta.length(), 16)
+		delta.ops = [{'insert': 'a'}]
+		self.assertEqual(delta.length(), 1)
+
+		document = Delta().insert('hello').insert({'image': 'https://octodex.github.com/images/labtocat.png'})
+		self.assertEqual(document._plain_text(), 'hello' + chr(0))
+		document.insert(' world', {'bold': True}).insert('!')
+		self.assertEqual(document._text_parts, ['hello' + chr(0), ' world', '!'])
+		self.assertEqual(document._plain_text(), 'hello' + chr(0) + ' world!')
+		document.ops.pop()
+		self.assertEqual(document._plain_text(), 'hello' + chr(0) + ' world')
+
+		document.delete(1)
+		with self.assertRaises(Exception):
+			document._plain_text()
+
+		# diff reads the cached text and offsets, so it sees ops changed directly, anywhere in the list
+		a = Delta().insert('abc').insert('def', {'bold': True}).insert('ghj')
+		b = Delta().insert('abc').insert('xy', {'italic': True}).insert('ghj')
+		self.assertEqual(a.compose(a.diff(b)), b)
+		b.ops[1] = {'insert': 'XYZWV', 'attributes': {'italic': True}}
+		self.assertEqual(a.compose(a.diff(b)), Delta().insert('abc').insert('XYZWV', {'italic': True}).insert('ghj'))
+		a.ops[2] = {'insert': 'g'}
+		self.assertEqual(a.compose(a.diff(b)), b)
+
+	def test_fingerprint(self):
+		delta = Delta().insert('hello').delete(3)
+		self.assertEqual(delta.fingerprint(), Delta([{'insert': u'hello'}, {'delete': 3}]).fingerprint())
+		self.assertNotEqual(delta.fingerprint(), Delta().delete(3).insert('hello ').fingerprint())
+		self.assertNotEqual(Delta().fingerprint(), Delta().retain(1).fingerprint())
+
+		# kept up to date by push, including inserts moved ahead of deletes, and chop
+		delta.insert(' world', {'bold': True}).retain(4).insert({'image': 'https://octodex.github.com/images/labtocat.png'})
+		self.assertEqual(delta._hashes[-1], Delta(delta.get_ops()).fingerprint())
+		delta.delete(2).insert('!').retain(2)
+		self.assertEqual(delta._hashes[-1], Delta(delta.get_ops()).fingerprint())
+		delta.chop()
+		self.assertEqual(delta._hashes[-1], Delta(delta.get_ops()).fingerprint())
+
+		# and recomputed after the ops are changed directly
+		fingerprint = delta.fingerprint()
+		delta.ops.append({'retain': 2})
+		self.assertNotEqual(delta.fingerprint(), fingerprint)
+		delta.ops = []
+		self.assertEqual(delta.fingerprint(), Delta().fingerprint())
+
+		# equality with known fingerprints
+		a = Delta().insert('a' * 100)
+		b = Delta().insert('a' * 99).insert('b')
+		a.fingerprint()
+		b.fingerprint()
+		self.assertNotEqual(a, b)
+		b.ops = [{'insert': 'a' * 100}]
+		self.assertEqual(a, b)
+
+		# and after ops in the middle of the list are replaced
+		a = Delta().insert('a').retain(1).insert('c', {'bold': True})
+		b = Delta().insert('a').retain(2).insert('c', {'bold': True})
+		a.fingerprint()
+		b.fingerprint()
+		self.assertNotEqual(a, b)
+		b.ops[1] = {'retain': 1}
+		self.assertEqual(a, b)
+		self.assertEqual(a.fingerprint(), b.fingerprint())
+
+		# nested attributes, which are hashed through their frozen form
+		a = Delta().insert('a', {'link': {'href': 'x', 'rel': ['nofollow']}})
+		b = Delta([{'insert': 'a', 'attributes': {'link': {'rel': ['nofollow'], 'href': 'x'}}}])
+		self.assertEqual(a.fingerprint(), b.fingerprint())
+		self.assertNotEqual(a.fingerprint(), Delta().insert('a', {'link': {'href': 'y', 'rel': ['nofollow']}}).fingerprint())
+		self.assertEqual(a.retain(1, {'link': {'href': 'x'}}).fingerprint(), Delta(a.get_ops()).fingerprint())
+
+		rng = random.Random(17)
+		for i in xrange(100):
+			base = random_document(rng, rng.randint(0, 30))
+			change = random_change(rng, base.length())
+			composed = Delta()
+			composed.fingerprint()
+			for op in base.compose(change).ops:
+				composed.push(op)
+			self.assertEqual(composed.fingerprint(), Delta(composed.get_ops()).fingerprint())
+
 	def test_chop(self):
 		delta = Delta().retain(10).retain(10).retain(10).delete(5).delete(5).delete(5)
 		self.assertEqual(delta.get_ops(), [{'retain': 30}, {'delete': 15}])
@@ -296,6 +471,91 @@ class TestDelta(TestCase):
 		self.assertEqual(b1, b2)
 		self.assertEqual(attr1, attr2)
 
+	def test_compose_retained(self):
+		# ops before and after the edit are copied across, but still normalized the same way as the rest
+		a = Delta([{'insert': 'ab', 'attributes': {'bold': True, 'color': None}}, {'retain': 2, 'attributes': {}}, {'insert': 'cd'}])
+		self.assertEqual(a.compose(Delta().retain(4).insert('x')).ops, [{'insert': 'ab', 'attributes': {'bold': True, 'color': None}}, {'retain': 2}, {'insert': 'xcd'}])
+		self.assertEqual(a.compose(Delta().retain(5).delete(1)).ops, [{'insert': 'ab', 'attributes': {'bold': True, 'color': None}}, {'retain': 2}, {'insert': 'c'}])
+		self.assertEqual(a.compose(Delta()).ops, [{'insert': 'ab', 'attributes': {'bold': True, 'color': None}}, {'retain': 2}, {'insert': 'cd'}])
+
+		# changes retaining past the end of self
+		self.assertEqual(Delta().insert('ab').compose(Delta().retain(5).insert('x')), Delta().insert('ab').retain(3).insert('x'))
+
+		# ops given in a form pushing wouldn't leave them in are still combined
+		a = Delta([{'insert': 'a'}, {'insert': 'b'}])
+		self.assertEqual(a.compose(Delta().retain(2).insert('c')).ops, [{'insert': 'abc'}])
+		self.assertEqual(a.compose(Delta().retain(1).delete(1)).ops, [{'insert': 'a'}])
+		a = Delta([{'retain': 2}, {'retain': 3}, {'delete': 1}, {'delete': 1}, {'insert': 'x'}, {'insert': 'y'}])
+		self.assertEqual(a.compose(Delta().retain(1).insert('z')).ops, [{'retain': 1}, {'insert': 'z'}, {'retain': 4}, {'insert': 'xy'}, {'delete': 2}])
+		self.assertEqual(a.compose(Delta().retain(7).insert('z')).ops, [{'retain': 5}, {'insert': 'xyz'}, {'delete': 2}])
+
+		# once changed other than by pushing, ops are checked again
+		a = Delta().insert('ab')
+		self.assertEqual(a.compose(Delta().retain(2).insert('c')).ops, [{'insert': 'abc'}])
+		a.ops.append({'insert': 'd'})
+		self.assertEqual(a.compose(Delta().retain(3).insert('e')).ops, [{'insert': 'abde'}])
+
+		# normalizing attributes can leave ops to combine
+		a = Delta([{'insert': 'a', 'attributes': {}}, {'insert': 'b'}, {'retain': 1, 'attributes': {}}, {'retain': 1}])
+		self.assertEqual(a.compose(Delta().retain(4).insert('c')).ops, [{'insert': 'ab'}, {'retain': 2}, {'insert': 'c'}])
+
+		# matches composing without copying, as compose_stream does
+		rng = random.Random(14)
+		for i in xrange(300):
+			a = Delta()
+			for j in xrange(rng.randint(0, 30)):
+				choice = rng.random()
+				if choice < 0.6:
+					a.insert(rng.choice(['x', 'yz', 1]), rng.choice([None, {'bold': True}, {'bold': None}]))
+				elif choice < 0.8:
+					a.delete(rng.randint(1, 3))
+				else:
+					a.retain(rng.randint(1, 3), rng.choice([None, {'bold': True}, {'color': 'red', 'bold': None}]))
+			b = Delta().retain(rng.randint(0, a.length() + 2))
+			for j in xrange(rng.randint(0, 3)):
+				choice = rng.random()
+				if choice < 0.4:
+					b.insert(rng.choice(['x', 'yz', 1]), rng.choice([None, {'bold': True}]))
+				elif choice < 0.7:
+					b.delete(rng.randint(1, 3))
+				else:
+					b.retain(rng.randint(1, 3), rng.choice([None, {'italic': True}]))
+			self.assertEqual(a.compose(b).ops, list(Delta.compose_stream(a.ops, b.ops)))
+
+	def test_compose_many(self):
+		self.assertEqual(Delta.compose_many([]), Delta())
+
+		delta = Delta().insert('A')
+		composed = Delta.compose_many([delta])
+		self.assertEqual(composed, delta)
+		composed.insert('B')
+		self.assertEqual(delta, Delta().insert('A'))
+
+		# matches folding compose over the same deltas
+		rng = random.Random(7)
+		for i in xrange(50):
+			deltas = []
+			document = Delta()
+			for j in xrange(rng.randint(1, 20)):
+				delta = Delta()
+				length = document.length()
+				position = 0
+				while position < length:
+					choice = rng.random()
+					size = rng.randint(1, length - position)
+					if choice < 0.4:
+						delta.retain(size, rng.choice([None, {'bold': True}, {'bold': None}]))
+						position += size
+					elif choice < 0.6:
+						delta.delete(size)
+						position += size
+					else:
+						delta.insert(rng.choice(['x', 'yz', 1]), rng.choice([None, {'italic': True}]))
+				delta.insert('end', rng.choice([None, {'italic': True}]))
+				document = document.compose(delta)
+				deltas.append(delta)
+			self.assertEqual(Delta.compose_many(deltas), document)
+
 	def test_transform(self):
 		# tests replicated from https://github.com/ottypes/rich-text/blob/master/test/delta/transform.js
 
@@ -421,6 +681,65 @@ class TestDelta(TestCase):
 		self.assertEqual(a1, a2)
 		self.assertEqual(b1, b2)
 
+	def test_transform_x(self):
+		a = Delta().retain(2).insert('si').delete(5)
+		b = Delta().retain(1).insert('e').delete(5).retain(1).insert('ow')
+		self.assertEqual(a.transform_x(b, False), (Delta().retain(2).insert('si').delete(1), Delta().retain(1).insert('e').delete(1).retain(2).insert('ow')))
+
+		# matches transforming each side separately
+		rng = random.Random(8)
+		def random_delta():
+			delta = Delta()
+			for i in xrange(rng.randint(0, 8)):
+				choice = rng.random()
+				if choice < 0.3:
+					delta.insert(rng.choice(['x', 'yz', 1]), rng.choice([None, {'bold': True}]))
+				elif choice < 0.5:
+					delta.delete(rng.randint(1, 3))
+				else:
+					delta.retain(rng.randint(1, 3), rng.choice([None, {'bold': True}, {'color': 'red', 'bold': None}]))
+			return delta
+
+		for i in xrange(200):
+			a = random_delta()
+			b = random_delta()
+			for priority in [True, False]:
+				self.assertEqual(a.transform_x(b, priority), (b.transform(a, not priority), a.transform(b, priority)))
+
+	def test_streams(self):
+		a = Delta().insert('Hello', {'bold': True}).insert(' World')
+		b = Delta().retain(6).delete(5).insert('there').retain(1, {'bold': True})
+		self.assertEqual(list(Delta.compose_stream(iter(a.ops), iter(b.ops))), a.compose(b).ops)
+
+		# matches composing and transforming the whole deltas
+		rng = random.Random(9)
+		def random_delta():
+			delta = Delta()
+			for i in xrange(rng.randint(0, 12)):
+				choice = rng.random()
+				if choice < 0.3:
+					delta.insert(rng.choice(['x', 'yz', 1]), rng.choice([None, {'bold': True}]))
+				elif choice < 0.5:
+					delta.delete(rng.randint(1, 3))
+				else:
+					delta.retain(rng.randint(1, 3), rng.choice([None, {'bold': True}, {'color': 'red', 'bold': None}]))
+			return delta
+
+		for i in xrange(200):
+			a = random_delta()
+			b = random_delta()
+			self.assertEqual(Delta(list(Delta.compose_stream(iter(a.ops), iter(b.ops)))), a.compose(b))
+			for priority in [True, False]:
+				self.assertEqual(Delta(list(Delta.transform_stream(iter(a.ops), iter(b.ops), priority))), a.transform(b, priority))
+
+		# only the current op of each input is ever held, so inputs can be generated lazily
+		document = ({'insert': 'line %d\n' % i, 'attributes': {'bold': True} if i % 2 else None} for i in xrange(100000))
+		document = (op if op['attributes'] else {'insert': op['insert']} for op in document)
+		change = iter([{'retain': 7}, {'insert': 'X'}])
+		composed = Delta.compose_stream(document, change)
+		self.assertEqual(next(composed), {'insert': 'line 0\nX'})
+		self.assertEqual(next(composed), {'insert': 'line 1\n', 'attributes': {'bold': True}})
+
 	def test_transform_position(self):
 		# tests replicated from https://github.com/ottypes/rich-text/blob/master/test/delta/transform-position.js
 
@@ -461,6 +780,30 @@ class TestDelta(TestCase):
 		delta = Delta().delete(1).retain(1).delete(4)
 		self.assertEqual(delta.transform_position(4), 1)
 
+	def test_transform_positions(self):
+		delta = Delta().retain(2).insert('A').delete(2)
+		self.assertEqual(delta.transform_positions([4, 2, (1, 4), -1, 10]), [3, 2, (1, 3), -1, 9])
+		self.assertEqual(delta.transform_positions([2, (2, 2)], False), [3, (3, 3)])
+		self.assertEqual(delta.transform_positions([]), [])
+		self.assertEqual(Delta().transform_positions([3, (1, 2)]), [3, (1, 2)])
+
+		# matches transforming each position separately
+		rng = random.Random(6)
+		for i in xrange(100):
+			delta = Delta()
+			for j in xrange(rng.randint(0, 10)):
+				choice = rng.random()
+				if choice < 0.3:
+					delta.insert('x' * rng.randint(1, 3))
+				elif choice < 0.6:
+					delta.delete(rng.randint(1, 3))
+				else:
+					delta.retain(rng.randint(1, 3), rng.choice([None, {'bold': True}]))
+			indexes = [rng.randint(0, 20) for j in xrange(10)]
+			for priority in [True, False]:
+				expected = [delta.transform_position(index, priority) for index in indexes]
+				self.assertEqual(delta.transform_positions(indexes, priority), expected)
+
 	def test_slice(self):
 		# tests replicated from https://github.com/ottypes/rich-text/blob/master/test/delta/helpers.js
 
@@ -499,6 +842,41 @@ class TestDelta(TestCase):
 		expected = Delta().insert('B', {'bold': True})
 		self.assertEqual(slice, expected)
 
+	def test_position_index(self):
+		delta = Delta().insert('0123', {'bold': True}).insert('4567').insert({'image': 'https://octodex.github.com/images/labtocat.png'}).insert('89')
+		self.assertEqual(delta.slice(5, 10), Delta().insert('567').insert({'image': 'https://octodex.github.com/images/labtocat.png'}).insert('8'))
+
+		# index is kept up to date as ops are pushed
+		delta.insert('ab').insert('c', {'bold': True}).delete(2).insert('d', {'bold': True}).retain(3)
+		self.assertEqual(delta._position_index(), [0, 4, 8, 9, 13, 15, 17, 20])
+		delta.chop()
+		self.assertEqual(delta._position_index(), [0, 4, 8, 9, 13, 15, 17])
+		self.assertEqual(delta.slice(11), Delta().insert('ab').insert('cd', {'bold': True}).delete(2))
+
+		# and rebuilt if the ops were changed directly
+		delta.ops.append({'insert': 'e'})
+		self.assertEqual(delta._position_index(), [0, 4, 8, 9, 13, 15, 17, 18])
+		delta.ops = [{'insert': 'fgh'}]
+		self.assertEqual(delta.slice(1), Delta().insert('gh'))
+
+		# including changes in the middle of the ops, or through a list shared with another delta
+		document = Delta().insert('aaa', {'bold': True}).insert('bbb').insert('ccc', {'bold': True})
+		self.assertEqual(document.slice(1), Delta().insert('aa', {'bold': True}).insert('bbb').insert('ccc', {'bold': True}))
+		document.ops[0] = {'insert': 'a'}
+		self.assertEqual(document.slice(2), Delta().insert('bb').insert('ccc', {'bold': True}))
+		del document.ops[1:]
+		self.assertEqual(document.slice(0), Delta().insert('a'))
+		shared = Delta(document.ops)
+		self.assertIs(shared.ops, document.ops)
+		shared.insert('bcd', {'bold': True})
+		self.assertEqual(document.slice(2), Delta().insert('cd', {'bold': True}))
+
+		# copies of a delta are indexed separately
+		copy = Delta(delta)
+		copy.insert('i')
+		self.assertEqual(delta.slice(1), Delta().insert('gh'))
+		self.assertEqual(copy.slice(1), Delta().insert('ghi'))
+
 	def test_concat(self):
 		# tests replicated from https://github.com/ottypes/rich-text/blob/master/test/delta/helpers.js
 
@@ -520,6 +898,20 @@ class TestDelta(TestCase):
 		expected = Delta().insert('Test!', {'bold': True }).insert('\n')
 		self.assertEqual(delta.concat(concat), expected)
 
+	def test_invert(self):
+		base = Delta().insert('Hello', {'bold': True}).insert({'image': 'https://octodex.github.com/images/labtocat.png'}).insert(' World', {'color': 'red'})
+		change = Delta().retain(2).delete(4).insert('y').retain(3, {'bold': True, 'color': 'blue'}).retain(1, {'color': None})
+		inverted = change.invert(base)
+		self.assertEqual(inverted, Delta().retain(2).delete(1).insert('llo', {'bold': True}).insert({'image': 'https://octodex.github.com/images/labtocat.png'}).retain(3, {'bold': None, 'color': 'red'}).retain(1, {'color': 'red'}))
+		self.assertEqual(base.compose(change).compose(inverted), base)
+
+		# matches undoing the change by diffing
+		rng = random.Random(13)
+		for i in xrange(100):
+			base = random_document(rng, rng.randint(0, 30))
+			change = random_change(rng, base.length())
+			self.assertEqual(base.compose(change).compose(change.invert(base)), base)
+
 	def test_diff(self):
 		# tests replicated from https://github.com/ottypes/rich-text/blob/master/test/delta/diff.js
 		
@@ -622,3 +1014,65 @@ class TestDelta(TestCase):
 		self.assertEqual(a1, a2)
 		self.assertEqual(b2, b2)
 		self.assertEqual(attr1, attr2)
+
+	def test_diff_trimming(self):
+		words = ['word%d ' % i for i in xrange(1000)]
+		a = Delta()
+		for i, word in enumerate(words):
+			a.insert(word, {'bold': True} if i % 2 else None)
+
+		# change in the middle
+		b = Delta(a)
+		b.ops[500] = {'insert': 'changed '}
+		diff = a.diff(b)
+		self.assertEqual(diff.ops[0], {'retain': len(''.join(words[:500]))})
+		self.assertTrue(diff.length() < a.length() // 2 + 20)
+		self.assertEqual(a.compose(diff), b)
+
+		# formatting only changes never diff the text
+		diff_main = diff_match_patch.diff_main
+		def fail(*args, **kwargs):
+			raise AssertionError('text diffed')
+		diff_match_patch.diff_main = fail
+		try:
+			b = a.compose(Delta().retain(100).retain(50, {'italic': True}))
+			self.assertEqual(a.diff(b), Delta().retain(100).retain(50, {'italic': True}))
+			b = a.compose(Delta().retain(6).retain(6, {'bold': None}))
+			self.assertEqual(a.diff(b), Delta().retain(6).retain(6, {'bold': None}))
+			self.assertEqual(Delta().insert(1).diff(Delta().insert(2)), Delta().insert(2).delete(1))
+		finally:
+			diff_match_patch.diff_main = diff_main
+
+		# non-documents are still rejected when their ops are shared
+		with self.assertRaises(Exception):
+			Delta().insert('A').retain(1).insert('B').diff(Delta().insert('A').retain(1).insert('C'))
+
+	def test_diff_budget(self):
+		a = Delta().insert('first line\nsecond line\n').insert('third line\n', {'bold': True})
+		b = Delta().insert('first line\nsecond row\n').insert('third line\n', {'italic': True})
+
+		diff, minimal = a.diff_with_status(b)
+		self.assertEqual(diff, Delta().retain(18).insert('row').delete(4).retain(1).retain(11, {'bold': None, 'italic': True}))
+		self.assertEqual(minimal, True)
+		self.assertEqual(a.diff(b), diff)
+		self.assertEqual(a.diff_with_status(a), (Delta(), True))
+
+		# over budget falls back to diffing whole lines
+		diff, minimal = a.diff_with_status(b, max_cost=100)
+		self.assertEqual(diff, Delta().retain(11).insert('second row\n').delete(12).retain(11, {'bold': None, 'italic': True}))
+		self.assertEqual(minimal, False)
+		self.assertEqual(a.compose(diff), b)
+
+		# and to replacing the changed text outright
+		diff, minimal = a.diff_with_status(b, max_cost=1)
+		self.assertEqual(minimal, False)
+		self.assertEqual(a.compose(diff), b)
+
+		# timeouts still give a correct diff
+		rng = random.Random(10)
+		a = Delta().insert(''.join([rng.choice('abcd') for i in xrange(3000)]))
+		b = Delta().insert(''.join([rng.choice('abcd') for i in xrange(3000)]))
+		diff, minimal = a.diff_with_status(b, timeout=0.001)
+		self.assertEqual(minimal, False)
+		self.assertEqual(a.compose(diff), b)
+		self.assertEqual(a.compose(a.diff(b, timeout=0)), b)
@@ -0,0 +1,132 @@
+"""
+richtextpy.tests.test_document
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import random
+from unittest import TestCase
+from richtextpy import Delta, Document
+from richtextpy import rope
+from richtextpy.op import Op, INSERT
+
+
+def random_document(rng, length):
+	delta = Delta()
+	for i in xrange(length):
+		choice = rng.random()
+		if choice < 0.1:
+			delta.insert({'image': 'image%d.png' % rng.randint(0, 3)})
+		elif choice < 0.4:
+			delta.insert(rng.choice(['a', 'bc', 'def']), {'bold': True})
+		else:
+			delta.insert(rng.choice(['g', 'hi', 'jkl', '\n']), rng.choice([None, {'color': 'red'}]))
+	return delta
+
+def random_change(rng, length):
+	change = Delta()
+	position = 0
+	while position < length:
+		choice = rng.random()
+		size = rng.randint(1, max(1, min(20, length - position)))
+		if choice < 0.4:
+			change.retain(size)
+			position += size
+		elif choice < 0.6:
+			change.retain(size, rng.choice([{'bold': None}, {'italic': True}, {'color': 'blue', 'bold': True}]))
+			position += size
+		elif choice < 0.8:
+			change.delete(size)
+			position += size
+		else:
+			change.insert(rng.choice(['x', 'yz']), rng.choice([None, {'bold': True}]))
+	return change
+
+
+class TestDocument(TestCase):
+	def test_constructor(self):
+		document = Document()
+		self.assertEqual(document.get_ops(), [])
+		self.assertEqual(document.length(), 0)
+
+		document = Document([{'insert': 'hello'}, {'insert': ' world', 'attributes': {'bold': True}}])
+		self.assertEqual(document.to_delta(), Delta().insert('hello').insert(' world', {'bold': True}))
+		self.assertEqual(document.length(), 11)
+
+		document = Document(Delta().insert('hello'))
+		self.assertEqual(document.get_ops(), [{'insert': 'hello'}])
+
+		with self.assertRaises(Exception):
+			Document(Delta().retain(1).insert('hello'))
+
+		# the document holds its own copies of the ops, and hands out new ones
+		ops = [{'insert': 'hello', 'attributes': {'link': {'href': 'a'}}}, {'insert': {'image': 'a.png'}}]
+		document = Document(ops)
+		ops[0]['insert'] = 'world'
+		ops[0]['attributes']['link']['href'] = 'b'
+		ops[1]['insert']['image'] = 'b.png'
+		copy = document.to_delta()
+		copy.ops[0]['insert'] = 'world'
+		with self.assertRaises(TypeError):
+			copy.ops[1]['insert']['image'] = 'b.png'
+		with self.assertRaises(TypeError):
+			copy.ops[0]['attributes']['link']['href'] = 'b'
+		document.apply(Delta().retain(5).insert('!'))
+		self.assertEqual(document.get_ops(), [{'insert': 'hello', 'attributes': {'link': {'href': 'a'}}}, {'insert': '!'}, {'insert': {'image': 'a.png'}}])
+
+	def test_apply(self):
+		document = Document(Delta().insert('The quick ').insert('brown', {'color': 'brown'}).insert(' fox'))
+		document.apply(Delta().retain(10).delete(5).insert('red', {'color': 'red'}))
+		expected = Delta().insert('The quick ').insert('red', {'color': 'red'}).insert(' fox')
+		self.assertEqual(document.to_delta(), expected)
+
+		document.apply([{'retain': 4}, {'retain': 5, 'attributes': {'bold': True}}])
+		expected = Delta().insert('The ').insert('quick', {'bold': True}).insert(' ').insert('red', {'color': 'red'}).insert(' fox')
+		self.assertEqual(document.to_delta(), expected)
+
+		document.apply(Delta().retain(4).retain(5, {'bold': None}).retain(8).insert('!'))
+		expected = Delta().insert('The quick ').insert('red', {'color': 'red'}).insert(' fox!')
+		self.assertEqual(document.to_delta(), expected)
+
+		# changes that retain or delete past the end are rejected, leaving the document as it was
+		for change in [Delta().retain(4).retain(100).insert('!'), Delta().delete(100), Delta().retain(18).delete(1), Delta().delete(10).retain(9)]:
+			with self.assertRaises(ValueError):
+				document.apply(change)
+			self.assertEqual(document.to_delta(), expected)
+
+		document.apply(Delta().delete(18))
+		self.assertEqual(document.to_delta(), Delta())
+
+	def test_slice(self):
+		document = Document(Delta().insert('0123', {'bold': True}).insert('4567'))
+		self.assertEqual(document.slice(3, 5), Delta().insert('3', {'bold': True}).insert('4'))
+		self.assertEqual(document.slice(6), Delta().insert('67'))
+		self.assertEqual(document.slice(), document.to_delta())
+
+	def test_matches_compose(self):
+		rng = random.Random(5)
+		snapshot = random_document(rng, 1000)
+		document = Document(snapshot)
+		for i in xrange(200):
+			change = random_change(rng, snapshot.length())
+			snapshot = snapshot.compose(change)
+			document.apply(change)
+			self.assertEqual(document.to_delta(), snapshot)
+			self.assertEqual(document.length(), snapshot.length())
+
+	def test_balanced(self):
+		document = Document(Delta().insert('a' * 100000, {'bold': True}))
+		for i in xrange(2000):
+			document.apply(Delta().retain(i * 40).insert('x').retain(10, {'italic': True}))
+		self.assertEqual(document.length(), 102000)
+		# an AVL tree of n leaves is at most about 1.44 log2(n) high
+		leaves = document._root.count
+		self.assertTrue(document._root.height <= 1.45 * len(bin(leaves)) + 2)
+
+	def test_immutable_nodes(self):
+		ops = [Op(INSERT, 1, chr(65 + i % 26), {'n': i}) for i in xrange(1000)]
+		tree = rope.build(ops)
+		left, right = rope.split(tree, 500)
+		self.assertEqual(list(rope.iter_ops(tree)), ops)
+		self.assertEqual(list(rope.iter_ops(left)), ops[:500])
+		self.assertEqual(list(rope.iter_ops(rope.join(left, right))), ops)
@@ -0,0 +1,117 @@
+"""
+richtextpy.tests.test_immutable
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import random
+from unittest import TestCase
+from richtextpy import Delta, ImmutableDelta
+from test_document import random_document, random_change
+
+
+def leaves(tree):
+	if tree is None:
+		return []
+	if tree.ops is not None:
+		return [tree]
+	return leaves(tree.left) + leaves(tree.right)
+
+
+class TestImmutableDelta(TestCase):
+	def test_constructor(self):
+		delta = Delta().insert('hello', {'bold': True}).retain(3).delete(2)
+		immutable = ImmutableDelta(delta)
+		self.assertEqual(immutable.to_delta(), delta)
+		self.assertEqual(ImmutableDelta(delta.get_ops()).get_ops(), delta.get_ops())
+		self.assertEqual(ImmutableDelta(immutable), immutable)
+		self.assertEqual(immutable.length(), 10)
+
+		# later changes to the source delta or to the ops handed out don't reach the immutable delta
+		delta.insert('!')
+		delta.ops[0]['insert'] = 'world'
+		immutable.to_delta().ops[0]['insert'] = 'world'
+		self.assertEqual(immutable.to_delta(), Delta().insert('hello', {'bold': True}).retain(3).delete(2))
+
+		# including nested attributes, which are frozen all the way down
+		immutable = ImmutableDelta(Delta().insert('hello', {'link': {'href': 'https://octodex.github.com'}}))
+		with self.assertRaises(TypeError):
+			immutable.to_delta().ops[0]['attributes']['link']['href'] = 'whoops'
+		self.assertEqual(immutable.get_ops(), [{'insert': 'hello', 'attributes': {'link': {'href': 'https://octodex.github.com'}}}])
+
+		# and embeds spliced in by compose, as well as those the delta was created with
+		document = ImmutableDelta(Delta().insert('a'))
+		embed = {'image': 'x', 'size': [1, 2]}
+		composed = document.compose(Delta().retain(1).insert(embed))
+		embed['image'] = 'whoops'
+		with self.assertRaises(TypeError):
+			composed.to_delta().ops[1]['insert']['image'] = 'EVIL'
+		with self.assertRaises(TypeError):
+			composed.to_delta().ops[1]['insert']['size'].append(3)
+		with self.assertRaises(TypeError):
+			composed.compose([{'retain': 1}, {'retain': 1, 'attributes': {'link': {'href': 'y'}}}]).to_delta().ops[1]['attributes']['link']['href'] = 'z'
+		self.assertEqual(composed.get_ops(), [{'insert': 'a'}, {'insert': {'image': 'x', 'size': [1, 2]}}])
+
+	def test_builders(self):
+		empty = ImmutableDelta()
+		immutable = empty.insert('abc').insert('d', {'bold': True}).retain(2).delete(1).insert('e')
+		self.assertEqual(immutable.to_delta(), Delta().insert('abc').insert('d', {'bold': True}).retain(2).insert('e').delete(1))
+		self.assertEqual(empty, ImmutableDelta())
+		self.assertEqual(empty.push({'insert': 'x'}), ImmutableDelta().insert('x'))
+
+	def test_concat_slice(self):
+		rng = random.Random(11)
+		for i in xrange(20):
+			a = random_document(rng, rng.randint(0, 300))
+			b = random_change(rng, 200)
+			immutable_a = ImmutableDelta(a)
+			immutable_b = ImmutableDelta(b)
+			self.assertEqual(immutable_a.concat(immutable_b).to_delta(), a.concat(b))
+			self.assertEqual(immutable_a.concat(b).to_delta(), a.concat(b))
+
+			start = rng.randint(0, a.length())
+			end = rng.randint(start, a.length())
+			self.assertEqual(immutable_a.slice(start, end).to_delta(), a.slice(start, end))
+			self.assertEqual(immutable_a.slice(start).to_delta(), a.slice(start))
+
+			self.assertEqual(immutable_a.to_delta(), a)
+
+	def test_compose(self):
+		rng = random.Random(12)
+		for i in xrange(20):
+			a = random_document(rng, rng.randint(0, 300))
+			change = random_change(rng, a.length())
+			immutable = ImmutableDelta(a)
+			self.assertEqual(immutable.compose(change).to_delta(), a.compose(change))
+			self.assertEqual(immutable.compose(ImmutableDelta(change)).to_delta(), a.compose(change))
+			self.assertEqual(immutable.to_delta(), a)
+
+			# including with changes that reach past the end of the document
+			change = random_change(rng, a.length() + rng.randint(1, 10))
+			self.assertEqual(immutable.compose(change).to_delta(), a.compose(change))
+
+			# deltas that aren't documents compose the same way
+			other = random_change(rng, change.length())
+			self.assertEqual(ImmutableDelta(change).compose(other).to_delta(), change.compose(other))
+			self.assertEqual(ImmutableDelta(change).transform(other, False).to_delta(), change.transform(other, False))
+
+	def test_compose_insert_only(self):
+		# deltas of only inserts compose as documents, as long as the change stays within them
+		self.assertEqual(ImmutableDelta(Delta().insert('x')).compose(Delta().retain(5).delete(2)).to_delta(), Delta().insert('x').retain(4).delete(2))
+		self.assertEqual(ImmutableDelta().compose(Delta().retain(3, {'bold': True})).to_delta(), Delta().retain(3, {'bold': True}))
+		self.assertEqual(ImmutableDelta().compose(Delta().insert('a')).to_delta(), Delta().insert('a'))
+		self.assertEqual(ImmutableDelta(Delta().insert('abc')).compose(ImmutableDelta(Delta().retain(1).delete(1).retain(1, {'bold': True}))).to_delta(), Delta().insert('a').insert('c', {'bold': True}))
+		self.assertEqual(ImmutableDelta(Delta().insert('abc')).compose(ImmutableDelta(Delta().retain(1).delete(1).retain(2, {'bold': True}))).to_delta(), Delta().insert('a').insert('c', {'bold': True}).retain(1, {'bold': True}))
+
+	def test_structural_sharing(self):
+		document = ImmutableDelta([{'insert': chr(65 + i % 26), 'attributes': {'n': i}} for i in xrange(10000)])
+		edited = document.compose(Delta().retain(5000).insert('!'))
+		self.assertEqual(edited.length(), 10001)
+
+		# only the chunks along the edit are new, the rest are shared with the original
+		original = set([id(leaf) for leaf in leaves(document._root)])
+		new = [leaf for leaf in leaves(edited._root) if id(leaf) not in original]
+		self.assertTrue(len(new) <= 3)
+
+		sliced = document.slice(0, 5000)
+		self.assertEqual(len([leaf for leaf in leaves(sliced._root) if id(leaf) not in original]), 1)
@@ -0,0 +1,57 @@
+"""
+richtextpy.tests.test_instrument
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy import instrument
+from richtextpy import type
+
+
+class TestInstrument(TestCase):
+	def tearDown(self):
+		del instrument.listeners[:]
+		instrument.disable_counters()
+
+	def test_listeners(self):
+		events = []
+		instrument.add_listener(events.append)
+
+		a = Delta().insert('hello').insert(u'w\xf6rld', {'bold': True})
+		b = Delta().retain(5).delete(1).insert('!')
+		a.compose(b)
+		self.assertEqual(len(events), 1)
+		self.assertEqual(events[0]['operation'], 'compose')
+		self.assertEqual(events[0]['input_ops'], 5)
+		self.assertEqual(events[0]['output_ops'], 2)
+		self.assertEqual(events[0]['insert_bytes'], 11)
+		self.assertTrue(events[0]['seconds'] >= 0)
+
+		b.transform(Delta().insert('A'), False)
+		a.diff(Delta().insert('help'))
+		self.assertEqual([event['operation'] for event in events], ['compose', 'transform', 'diff'])
+		self.assertEqual(events[2]['output_ops'], 3)
+
+		del events[:]
+		type.apply([{'insert': 'A'}], [{'insert': 'B'}])
+		self.assertEqual([event['operation'] for event in events], ['compose', 'apply'])
+		self.assertEqual(events[1]['input_ops'], 2)
+		self.assertEqual(events[1]['output_ops'], 1)
+
+		instrument.remove_listener(events.append)
+		a.compose(b)
+		self.assertEqual(len(events), 2)
+
+	def test_counters(self):
+		self.assertEqual(instrument.get_counters(), None)
+		instrument.enable_counters()
+
+		delta = Delta().insert('hello').insert(' world').push({'delete': 1})
+		delta.get_ops()
+		self.assertEqual(instrument.get_counters(), {'push_append': 2, 'push_merge': 1, 'deepcopy': 2})
+
+		instrument.disable_counters()
+		delta.insert('!')
+		self.assertEqual(instrument.get_counters(), None)
@@ -0,0 +1,75 @@
+"""
+richtextpy.tests.test_lazy
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import random
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy.lazy import LazyDelta
+from richtextpy.type_utils import TrackedList
+from test_document import random_document, random_change
+
+
+class CountingOps(TrackedList):
+	# ops list that counts how many of its ops have been read by iterating over it
+	# a Delta holds a TrackedList as it's given, rather than copying it, so reads through the delta are counted too
+	read = 0
+
+	def __iter__(self):
+		for op in list.__iter__(self):
+			CountingOps.read += 1
+			yield op
+
+
+class TestLazyDelta(TestCase):
+	def test_matches_eager(self):
+		rng = random.Random(17)
+		for i in xrange(50):
+			document = random_document(rng, rng.randint(0, 60))
+			a = random_change(rng, document.length())
+			b = random_change(rng, document.compose(a).length())
+			composed = document.compose(a).compose(b)
+
+			lazy = LazyDelta(document).compose(a).compose(b)
+			self.assertEqual(lazy.to_delta(), composed)
+			self.assertEqual(lazy.length(), composed.length())
+			self.assertEqual(Delta(list(lazy.iter_ops())), composed)
+
+			start = rng.randint(0, composed.length())
+			end = rng.randint(start, composed.length())
+			self.assertEqual(lazy.slice(start, end).to_delta(), composed.slice(start, end))
+			self.assertEqual(LazyDelta(document).compose(a).compose(b).slice(start, end).to_delta(), composed.slice(start, end))
+			self.assertEqual(lazy.slice(start).slice(1, end - start).to_delta(), composed.slice(start).slice(1, end - start))
+			self.assertEqual(lazy.slice(0, end).slice(start).to_delta(), composed.slice(0, end).slice(start))
+
+			self.assertEqual(lazy.concat(a).to_delta(), composed.concat(a))
+			self.assertEqual(LazyDelta(a).transform(b, False).compose(a).to_delta(), a.transform(b, False).compose(a))
+
+	def test_compose_chain(self):
+		a = Delta().insert('a')
+		b = Delta().retain(1).insert('b')
+		c = Delta().retain(2).insert('c')
+		lazy = LazyDelta(a).compose(b).compose(LazyDelta(c).compose(Delta().retain(3).insert('d')))
+		self.assertEqual(len(lazy._operands), 4)
+		self.assertEqual(lazy.get_ops(), [{'insert': 'abcd'}])
+
+		# the result is kept, and can't be changed through the delta handed out
+		delta = lazy.to_delta()
+		delta.insert('e')
+		self.assertEqual(lazy.to_delta(), Delta().insert('abcd'))
+
+	def test_slice_stops_early(self):
+		ops = CountingOps([{'insert': '%05d' % i, 'attributes': {'n': i % 2}} for i in xrange(10000)])
+		leaf = LazyDelta(ops)
+		self.assertTrue(leaf._delta.ops is ops)
+		lazy = leaf.compose(Delta().retain(3).insert('x')).compose(Delta().delete(1)).slice(0, 12)
+		CountingOps.read = 0
+		self.assertEqual(lazy.get_ops(), [{'insert': '00', 'attributes': {'n': 0}}, {'insert': 'x'}, {'insert': '00', 'attributes': {'n': 0}}, {'insert': '00001', 'attributes': {'n': 1}}, {'insert': '00', 'attributes': {'n': 0}}])
+		self.assertTrue(0 < CountingOps.read < 10)
+
+		# evaluating the whole composition reads every op
+		CountingOps.read = 0
+		self.assertEqual(leaf.compose(Delta().retain(3).insert('x')).to_delta().length(), 50001)
+		self.assertTrue(CountingOps.read >= 10000)
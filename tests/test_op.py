@@ -0,0 +1,130 @@
+"""
+richtextpy.tests.test_op
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import json
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy.op import Op, op_type, op_hash, intern_attributes, attr_compose, attr_transform, attr_diff, attr_invert, INSERT, DELETE, RETAIN
+
+
+class TestOp(TestCase):
+	def test_op_type(self):
+		self.assertEqual(op_type({'insert': 'hello'}), INSERT)
+		self.assertEqual(op_type({'insert': {'image': 'https://octodex.github.com/images/labtocat.png'}}), INSERT)
+		self.assertEqual(op_type({'delete': 3}), DELETE)
+		self.assertEqual(op_type({'retain': 3, 'attributes': {'bold': True}}), RETAIN)
+
+	def test_compact_op(self):
+		ops = [
+			{'insert': 'hello', 'attributes': {'bold': True}},
+			{'insert': {'image': 'https://octodex.github.com/images/labtocat.png'}},
+			{'retain': 4, 'attributes': {'color': 'red'}},
+			{'retain': 2, 'attributes': {}},
+			{'delete': 3},
+		]
+		compact = [Op.from_dict(op) for op in ops]
+		self.assertEqual(compact[0], Op(INSERT, 5, 'hello', {'bold': True}))
+		self.assertEqual(compact[1].length, 1)
+		self.assertEqual(compact[2], Op(RETAIN, 4, None, {'color': 'red'}))
+		self.assertEqual(compact[4], Op(DELETE, 3))
+		self.assertNotEqual(compact[3], compact[2])
+		self.assertEqual([op.to_dict() for op in compact], ops)
+		self.assertEqual(compact[0].slice(1, 3), Op(INSERT, 2, 'el', {'bold': True}))
+		self.assertEqual(compact[2].slice(1), Op(RETAIN, 3, None, {'color': 'red'}))
+
+		# values and attributes are frozen copies, and each op dict handed out is new
+		ops[1]['insert']['image'] = 'whoops'
+		self.assertEqual(compact[1].to_dict(), {'insert': {'image': 'https://octodex.github.com/images/labtocat.png'}})
+		with self.assertRaises(TypeError):
+			compact[1].to_dict()['insert']['image'] = 'whoops'
+		self.assertIsNot(compact[0].to_dict(), compact[0].to_dict())
+
+		with self.assertRaises(AttributeError):
+			compact[0].extra = True
+
+	def test_op_hash(self):
+		# equal ops hash the same
+		op = {'insert': u'caf\xe9', 'attributes': {'header': 1, 'link': {'href': 'x', 'size': [1.0, 2]}}}
+		self.assertEqual(op_hash(op), op_hash({'attributes': {'link': {'size': [True, 2.0], 'href': u'x'}, 'header': 1.0}, 'insert': u'caf\xe9'.encode('utf-8').decode('utf-8')}))
+		self.assertEqual(op_hash({'insert': 'abc'}), op_hash({'insert': u'abc'}))
+		self.assertNotEqual(op_hash({'insert': 'abc'}), op_hash({'insert': 'ab'}))
+		self.assertNotEqual(op_hash({'retain': 1}), op_hash({'retain': 1.5}))
+		self.assertNotEqual(op_hash({'insert': 'a', 'attributes': {'bold': True}}), op_hash({'insert': 'a', 'attributes': {'bold': 'true'}}))
+
+		# hashes don't depend on the process, so they're fixed values
+		self.assertEqual(op_hash({'insert': 'a', 'attributes': {'bold': True}}), 925826214748355630)
+		self.assertEqual(op_hash({'retain': 3}), 2134791019657164215)
+
+	def test_intern_attributes(self):
+		self.assertEqual(intern_attributes(None), None)
+		self.assertEqual(intern_attributes({}), None)
+
+		bold = intern_attributes({'bold': True})
+		self.assertEqual(bold, {'bold': True})
+		self.assertIs(intern_attributes({'bold': True}), bold)
+		self.assertIs(intern_attributes(bold), bold)
+
+		with self.assertRaises(TypeError):
+			bold['italic'] = True
+		with self.assertRaises(TypeError):
+			bold.update({'italic': True})
+
+		# nested values are interned as frozen copies
+		nested = {'list': {'type': 'bullet'}}
+		frozen = intern_attributes(nested)
+		nested['list']['type'] = 'ordered'
+		self.assertEqual(frozen, {'list': {'type': 'bullet'}})
+		self.assertIs(intern_attributes({'list': {'type': 'bullet'}}), frozen)
+		with self.assertRaises(TypeError):
+			frozen['list']['type'] = 'ordered'
+
+		# equal values of different types are interned separately, so they serialize the way they were given
+		header = intern_attributes({'header': True})
+		self.assertEqual(json.dumps(intern_attributes({'header': 1})), '{"header": 1}')
+		self.assertEqual(json.dumps(intern_attributes({'header': 1.0})), '{"header": 1.0}')
+		self.assertIs(intern_attributes({'header': True}), header)
+
+	def test_interned_ops(self):
+		a = Delta().insert('hello', {'bold': True}).insert(' world', {'bold': True, 'italic': True})
+		b = Delta().retain(11, {'italic': None})
+		composed = a.compose(b)
+		self.assertEqual(composed, Delta().insert('hello world', {'bold': True}))
+		self.assertIs(composed.ops[0]['attributes'], a.ops[0]['attributes'])
+
+		# copies handed out to callers are mutable
+		ops = composed.get_ops()
+		ops[0]['attributes']['bold'] = False
+		self.assertEqual(composed.get_ops(), [{'insert': 'hello world', 'attributes': {'bold': True}}])
+
+	def test_memoized_attributes(self):
+		a = intern_attributes({'bold': True, 'color': 'red'})
+		b = intern_attributes({'color': 'blue', 'font': None})
+		self.assertEqual(attr_compose(a, b, False), {'bold': True, 'color': 'blue'})
+		self.assertIs(attr_compose(a, b, False), attr_compose(a, b, False))
+		self.assertEqual(attr_compose(a, b, True), {'bold': True, 'color': 'blue', 'font': None})
+		self.assertEqual(attr_transform(a, b, True), {'font': None})
+		self.assertEqual(attr_transform(a, b, False), b)
+		self.assertEqual(attr_diff(a, b), {'bold': None, 'color': 'blue'})
+
+		# keyword arguments share results with positional ones
+		self.assertEqual(attr_transform(a, b, priority=False), b)
+		self.assertIs(attr_compose(a, b, keep_null=False), attr_compose(a, b, False))
+
+		# results for attributes with equal values of different types aren't shared
+		self.assertEqual(json.dumps(attr_compose(intern_attributes({'header': True}), None, False)), '{"header": true}')
+		self.assertEqual(json.dumps(attr_compose(intern_attributes({'header': 1}), None, False)), '{"header": 1}')
+
+		# plain dicts bypass the cache but give the same results
+		self.assertEqual(attr_compose({'bold': True, 'color': 'red'}, {'color': 'blue', 'font': None}, False), {'bold': True, 'color': 'blue'})
+		self.assertEqual(attr_diff({'bold': True, 'color': 'red'}, {'color': 'blue', 'font': None}), {'bold': None, 'color': 'blue'})
+
+	def test_attr_invert(self):
+		self.assertEqual(attr_invert({'bold': True}, None), {'bold': None})
+		self.assertEqual(attr_invert({'bold': None}, {'bold': True}), {'bold': True})
+		self.assertEqual(attr_invert({'color': 'red'}, {'color': 'blue', 'italic': True}), {'color': 'blue'})
+		self.assertEqual(attr_invert({'color': 'red'}, {'color': 'red'}), None)
+		self.assertEqual(attr_invert(None, {'bold': True}), None)
+		self.assertEqual(attr_invert({'bold': True, 'color': 'red', 'font': None}, {'bold': True, 'color': 'blue', 'size': 1}), {'color': 'blue'})
@@ -6,7 +6,7 @@ Copyright (c) 2016 Sachin Rekhi
 
 from unittest import TestCase
 from richtextpy import Delta
-from richtextpy.opiterator import OpIterator
+from richtextpy.opiterator import OpIterator, OpStreamIterator
 
 
 class TestOpIterator(TestCase):
@@ -26,3 +26,43 @@ class TestOpIterator(TestCase):
 		self.assertEqual(iterator.next(4), {'retain': 3})
 		self.assertEqual(iterator.peek_length(), 1)
 		self.assertEqual(iterator.next(5), {'insert': {'image': 'https://octodex.github.com/images/labtocat.png'}})
+
+	def test_seek(self):
+		delta = Delta().retain(20).insert('hello').delete(15).retain(3).insert({'image': 'https://octodex.github.com/images/labtocat.png'})
+
+		iterator = OpIterator(delta.get_ops())
+		iterator.seek(22)
+		self.assertEqual(iterator.peek_type(), 'insert')
+		self.assertEqual(iterator.next(), {'insert': 'llo'})
+
+		iterator.seek(25)
+		self.assertEqual(iterator.next(), {'delete': 15})
+
+		iterator.seek(0)
+		self.assertEqual(iterator.next(), {'retain': 20})
+
+		iterator.seek(43)
+		self.assertEqual(iterator.next(), {'insert': {'image': 'https://octodex.github.com/images/labtocat.png'}})
+		self.assertEqual(iterator.has_next(), False)
+
+		iterator.seek(100)
+		self.assertEqual(iterator.has_next(), False)
+		self.assertEqual(iterator.next(), {'retain': float('inf')})
+
+	def test_stream(self):
+		delta = Delta().retain(20).insert('hello').delete(15).retain(3).insert({'image': 'https://octodex.github.com/images/labtocat.png'})
+
+		iterator = OpStreamIterator(op for op in delta.get_ops())
+		self.assertEqual(iterator.peek_length(), 20)
+		self.assertEqual(iterator.next(), {'retain': 20})
+		self.assertEqual(iterator.next(3), {'insert': 'hel'})
+		self.assertEqual(iterator.peek_type(), 'insert')
+		self.assertEqual(iterator.next(), {'insert': 'lo'})
+		self.assertEqual(iterator.next(), {'delete': 15})
+		self.assertEqual(iterator.next(4), {'retain': 3})
+		self.assertEqual(iterator.next(), {'insert': {'image': 'https://octodex.github.com/images/labtocat.png'}})
+		self.assertEqual(iterator.has_next(), False)
+		self.assertEqual(iterator.next(), {'retain': float('inf')})
+
+		with self.assertRaises(Exception):
+			iterator.seek(0)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+richtextpy.tests.test_packed
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import random
+import sys
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy import packed
+from richtextpy.packed import PackedDelta
+
+
+def random_delta(rng):
+	delta = Delta()
+	for i in xrange(rng.randint(0, 12)):
+		choice = rng.random()
+		if choice < 0.4:
+			delta.insert(rng.choice(['x', 'yz', u'\xe9t\xe9', {'image': 'a.png'}]), rng.choice([None, {'bold': True}, {'link': {'href': 'b'}}]))
+		elif choice < 0.6:
+			delta.delete(rng.randint(1, 3))
+		else:
+			delta.retain(rng.randint(1, 3), rng.choice([None, {'bold': True}]))
+	return delta
+
+
+class TestPackedDelta(TestCase):
+	def run_with_and_without_numpy(self, test):
+		# run the test against the plain Python fallback, and against numpy too when it's installed
+		module_numpy = packed.numpy
+		try:
+			packed.numpy = None
+			test()
+		finally:
+			packed.numpy = module_numpy
+		if module_numpy != None:
+			test()
+
+	def test_round_trip(self):
+		delta = Delta().insert('hello', {'bold': True}).insert({'image': 'https://octodex.github.com/images/labtocat.png'}).insert(u' w\xf6rld', {'bold': True}).retain(3).retain(2, {'color': 'red'}).delete(4)
+		packed_delta = PackedDelta(delta)
+		self.assertEqual(len(packed_delta), 6)
+		self.assertEqual(packed_delta.to_delta(), delta)
+		self.assertEqual(len(packed_delta.attribute_sets), 2)
+		self.assertEqual(PackedDelta().to_delta(), Delta())
+
+		rng = random.Random(15)
+		for i in xrange(100):
+			delta = random_delta(rng)
+			self.assertEqual(PackedDelta(delta.ops).to_delta(), delta)
+
+	def test_positions(self):
+		def test():
+			delta = Delta().insert('abc').insert({'image': 'https://octodex.github.com/images/labtocat.png'}).retain(4, {'bold': True}).delete(2)
+			packed_delta = PackedDelta(delta)
+			self.assertEqual(packed_delta.length(), 10)
+			self.assertEqual(list(packed_delta.offsets()), [0, 3, 4, 8, 10])
+			self.assertEqual(packed_delta.find(0), (0, 0))
+			self.assertEqual(packed_delta.find(2), (0, 2))
+			self.assertEqual(packed_delta.find(3), (1, 0))
+			self.assertEqual(packed_delta.find(9), (3, 1))
+			self.assertEqual(packed_delta.find(12), (4, 2))
+			self.assertEqual(PackedDelta().length(), 0)
+
+		self.run_with_and_without_numpy(test)
+
+	def test_transform_position(self):
+		def test():
+			rng = random.Random(16)
+			for i in xrange(300):
+				delta = random_delta(rng)
+				packed_delta = PackedDelta(delta)
+				for index in xrange(15):
+					for priority in [True, False]:
+						self.assertEqual(packed_delta.transform_position(index, priority), delta.transform_position(index, priority))
+
+		self.run_with_and_without_numpy(test)
+
+	def test_memory(self):
+		delta = Delta()
+		for i in xrange(1000):
+			delta.insert('word ', {'bold': True} if i % 2 else None)
+		packed_delta = PackedDelta(delta)
+
+		dict_size = sum([sys.getsizeof(op) + sys.getsizeof(op['insert']) for op in delta.ops])
+		packed_size = sum([column.buffer_info()[1] * column.itemsize for column in [packed_delta.types, packed_delta.lengths, packed_delta.values, packed_delta.attributes]]) + len(packed_delta.text)
+		self.assertTrue(packed_size * 10 < dict_size)
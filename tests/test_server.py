@@ -0,0 +1,141 @@
+"""
+richtextpy.tests.test_server
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy import type
+from richtextpy.server import OTDocument, MemoryStore, FileStore
+
+
+class TestServer(TestCase):
+	def test_submit(self):
+		document = OTDocument()
+		self.assertEqual(document.version, 0)
+
+		self.assertEqual(document.submit(Delta().insert('Hello'), 0), (0, Delta().insert('Hello')))
+		self.assertEqual(document.submit([{'retain': 5}, {'insert': ' world'}], 1), (1, Delta().retain(5).insert(' world')))
+
+		# concurrent with the previous op
+		version, op = document.submit(Delta().retain(5).insert('!'), 1)
+		self.assertEqual(version, 2)
+		self.assertEqual(op, Delta().retain(11).insert('!'))
+		self.assertEqual(document.get_snapshot(), Delta().insert('Hello world!'))
+		self.assertEqual(document.version, 3)
+		self.assertEqual(document.get_ops(1), [Delta().retain(5).insert(' world'), Delta().retain(11).insert('!')])
+
+		with self.assertRaises(ValueError):
+			document.submit(Delta().insert('A'), 4)
+		with self.assertRaises(ValueError):
+			document.submit(Delta().insert('A'), -1)
+
+		# ops reaching past the end of the document are rejected without being logged
+		with self.assertRaises(ValueError):
+			document.submit(Delta().retain(2).delete(11), 3)
+		with self.assertRaises(ValueError):
+			document.submit(Delta().retain(13).insert('!'), 3)
+		self.assertEqual(document.version, 3)
+		self.assertEqual(document.get_snapshot(), Delta().insert('Hello world!'))
+
+		# nor can the snapshot handed out change the document
+		snapshot = document.get_snapshot()
+		snapshot.ops[0]['insert'] = 'HACKED'
+		self.assertEqual(document.get_snapshot(), Delta().insert('Hello world!'))
+
+		# ops handed out can't change the log
+		ops = document.get_ops(0)
+		ops[0].insert(' hacked')
+		with self.assertRaises(TypeError):
+			ops[1].ops[1]['insert'] = ' hacked'
+		with self.assertRaises(TypeError):
+			document.store.get_ops(0)[0].append({'insert': ' hacked'})
+		self.assertEqual(document.get_ops(0)[0], Delta().insert('Hello'))
+		self.assertEqual(document.version_at(3), Delta().insert('Hello world!'))
+
+	def test_concurrent_clients(self):
+		rng = random.Random(13)
+		document = OTDocument(MemoryStore())
+
+		for i in xrange(300):
+			base_version = rng.randint(max(0, document.version - 5), document.version)
+			base = Delta.compose_many(document.get_ops(0, base_version))
+			op = Delta().retain(rng.randint(0, base.length()))
+			if (rng.random() < 0.3) and (base.length() > op.length()):
+				op.delete(rng.randint(1, base.length() - op.length()))
+			else:
+				op.insert(rng.choice(['a', 'bc', 'def']), rng.choice([None, {'bold': True}]))
+
+			expected = op
+			for committed in document.get_ops(base_version):
+				expected = type.transform(expected.ops, committed.ops, 'left')
+			version = document.version
+			self.assertEqual(document.submit(op, base_version), (version, expected))
+
+		self.assertEqual(document.get_snapshot(), Delta.compose_many(document.get_ops(0)))
+
+	def test_file_store(self):
+		directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(directory, 'document.log')
+			document = OTDocument(FileStore(path))
+			document.submit(Delta().insert('Hello', {'bold': True}), 0)
+			document.submit(Delta().retain(5).insert(' world'), 1)
+			with self.assertRaises(ValueError):
+				document.submit(Delta().retain(2).delete(20), 2)
+
+			reopened = OTDocument(FileStore(path))
+			self.assertEqual(reopened.version, 2)
+			self.assertEqual(reopened.get_snapshot(), Delta().insert('Hello', {'bold': True}).insert(' world'))
+		finally:
+			shutil.rmtree(directory)
+
+	def test_checkpoints(self):
+		store = MemoryStore()
+		document = OTDocument(store, checkpoint_interval=10)
+		snapshots = [Delta()]
+		for i in xrange(35):
+			document.submit(Delta().retain(i).insert(chr(65 + i % 26), {'n': i % 3}), i)
+			snapshots.append(document.get_snapshot())
+
+		self.assertEqual(store._checkpoint_versions, [10, 20, 30])
+		self.assertEqual(store.get_checkpoint(25), (20, snapshots[20].get_ops()))
+		self.assertEqual(store.get_checkpoint(5), (0, []))
+		for version in xrange(36):
+			self.assertEqual(document.version_at(version), snapshots[version])
+		with self.assertRaises(ValueError):
+			document.version_at(36)
+
+		# by size of the ops
+		store = MemoryStore()
+		document = OTDocument(store, checkpoint_interval=None, checkpoint_bytes=100)
+		document.submit(Delta().insert('x' * 70), 0)
+		self.assertEqual(store._checkpoint_versions, [])
+		document.submit(Delta().insert('y'), 1)
+		self.assertEqual(store._checkpoint_versions, [2])
+		self.assertEqual(document.version_at(2), Delta().insert('y' + 'x' * 70))
+
+	def test_file_store_checkpoints(self):
+		directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(directory, 'document.log')
+			document = OTDocument(FileStore(path), checkpoint_interval=2)
+			for i in xrange(5):
+				document.submit(Delta().retain(i).insert(str(i)), i)
+
+			store = FileStore(path)
+			self.assertEqual(store.get_checkpoint(5), (4, [{'insert': '0123'}]))
+			reopened = OTDocument(store, checkpoint_interval=2)
+			self.assertEqual(reopened.get_snapshot(), Delta().insert('01234'))
+			self.assertEqual(reopened.version_at(3), Delta().insert('012'))
+
+			# the count towards the next checkpoint carries over
+			reopened.submit(Delta().retain(5).insert('5'), 5)
+			self.assertEqual(store.get_checkpoint(6), (6, [{'insert': '012345'}]))
+		finally:
+			shutil.rmtree(directory)
@@ -30,10 +30,32 @@ class TestType(TestCase):
 		expected = Delta().insert('B').insert('A')
 		self.assertEqual(delta, expected)
 
+		# ops not in canonical form are combined as they're composed
+		delta = type.apply([{'insert': 'a'}, {'insert': 'b'}], [{'retain': 2}, {'insert': 'c'}])
+		self.assertEqual(delta.ops, [{'insert': 'abc'}])
+		delta = type.compose([{'retain': 2}, {'retain': 3}, {'insert': 'a'}], [{'retain': 1}, {'insert': 'b'}])
+		self.assertEqual(delta.ops, [{'retain': 1}, {'insert': 'b'}, {'retain': 4}, {'insert': 'a'}])
+
+	def test_compose_many(self):
+		delta = type.compose_many([[{'insert': 'A'}], [{'insert': 'B'}], [{'retain': 1}, {'insert': 'C'}]])
+		expected = Delta().insert('BCA')
+		self.assertEqual(delta, expected)
+
+		self.assertEqual(type.compose_many([]), Delta())
+
 	def test_transform(self):
 		delta = type.transform([{'retain': 1, 'attributes': {'bold': True, 'color': 'red'}}], [{'delete': 1}], 'left')
 		expected = Delta()
 		self.assertEqual(delta, expected)
 
+	def test_transformX(self):
+		left = [{'retain': 3}, {'insert': 'aa'}]
+		right = [{'retain': 3}, {'insert': 'bb'}]
+		left_prime, right_prime = type.transformX(left, right)
+		self.assertEqual(left_prime, type.transform(left, right, 'left'))
+		self.assertEqual(right_prime, type.transform(right, left, 'right'))
+		self.assertEqual(left_prime, Delta().retain(5).insert('aa'))
+		self.assertEqual(right_prime, Delta().retain(3).insert('bb'))
+
 	def test_diff(self):
 		pass
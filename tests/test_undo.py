@@ -0,0 +1,99 @@
+"""
+richtextpy.tests.test_undo
+
+Copyright (c) 2016 Sachin Rekhi
+"""
+
+from unittest import TestCase
+from richtextpy import Delta
+from richtextpy.undo import UndoManager
+
+
+class TestUndoManager(TestCase):
+	def setUp(self):
+		self.document = Delta().insert('The lazy fox')
+		self.manager = UndoManager(delay=1.0, max_stack=3)
+
+	def edit(self, change, timestamp):
+		self.manager.record(change, self.document, timestamp)
+		self.document = self.document.compose(change)
+
+	def apply(self, change):
+		self.assertNotEqual(change, None)
+		self.document = self.document.compose(change)
+
+	def test_undo_redo(self):
+		original = self.document
+		self.edit(Delta().retain(4).insert('quick '), 0)
+		self.edit(Delta().retain(4).retain(5, {'bold': True}), 5)
+		edited = self.document
+		self.assertEqual(edited, Delta().insert('The ').insert('quick', {'bold': True}).insert(' lazy fox'))
+
+		self.apply(self.manager.undo())
+		self.assertEqual(self.document, Delta().insert('The quick lazy fox'))
+		self.apply(self.manager.undo())
+		self.assertEqual(self.document, original)
+		self.assertEqual(self.manager.undo(), None)
+
+		self.apply(self.manager.redo())
+		self.apply(self.manager.redo())
+		self.assertEqual(self.document, edited)
+		self.assertEqual(self.manager.redo(), None)
+
+		# a new change clears the redo stack
+		self.apply(self.manager.undo())
+		self.edit(Delta().insert('!'), 10)
+		self.assertEqual(self.manager.redo(), None)
+
+	def test_delay(self):
+		original = self.document
+		self.edit(Delta().retain(4).insert('q'), 0)
+		self.edit(Delta().retain(5).insert('u'), 0.5)
+		self.edit(Delta().retain(6).insert('i'), 0.9)
+		self.edit(Delta().retain(7).insert('ck '), 1.5)
+		self.assertEqual(len(self.manager.stack['undo']), 2)
+
+		self.apply(self.manager.undo())
+		self.assertEqual(self.document, Delta().insert('The quilazy fox'))
+		self.apply(self.manager.undo())
+		self.assertEqual(self.document, original)
+
+		# cutoff starts a new entry however soon the next change comes
+		self.edit(Delta().insert('A'), 20)
+		self.manager.cutoff()
+		self.edit(Delta().insert('B'), 20.1)
+		self.assertEqual(len(self.manager.stack['undo']), 2)
+
+	def test_max_stack(self):
+		for i in xrange(5):
+			self.edit(Delta().insert(str(i)), i * 10)
+		self.assertEqual(len(self.manager.stack['undo']), 3)
+
+		for i in xrange(3):
+			self.apply(self.manager.undo())
+		self.assertEqual(self.manager.undo(), None)
+		self.assertEqual(self.document, Delta().insert('10The lazy fox'))
+
+	def test_transform(self):
+		self.edit(Delta().retain(4).insert('quick '), 0)
+		self.edit(Delta().retain(15).delete(3), 5)
+
+		# someone else inserts at the start and replaces the text we deleted
+		remote = Delta().insert('>> ').retain(15).insert('dog')
+		self.manager.transform(remote)
+		self.document = self.document.compose(remote)
+		self.assertEqual(self.document, Delta().insert('>> The quick lazy dog'))
+
+		self.apply(self.manager.undo())
+		self.assertEqual(self.document, Delta().insert('>> The quick lazy dogfox'))
+		self.apply(self.manager.undo())
+		self.assertEqual(self.document, Delta().insert('>> The lazy dogfox'))
+
+		self.apply(self.manager.redo())
+		self.assertEqual(self.document, Delta().insert('>> The quick lazy dogfox'))
+
+		# entries whose changes were entirely overwritten by the remote change are dropped
+		manager = UndoManager()
+		manager.record(Delta().retain(4).retain(4, {'bold': True}), Delta().insert('The lazy fox'), 0)
+		manager.transform(Delta().retain(4).delete(4))
+		self.assertEqual(manager.undo(), None)